@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import math
+import random
+import sys
+import tarfile
+import time
+import uvicorn
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse, RedirectResponse
+from urllib.parse import urlencode
+from services.github.tarball import get_blob_sha
+
+"""
+An offline stand-in for the parts of Github that GithubClient and GithubOauth talk to, serving synthetic
+users, repositories and files. Latency, errors and rate limiting are simulated, so that joins and advances can be
+benchmarked end to end on a laptop. Run it from the api directory with python -m bench.github_standin
+and point the API at it through config, i.e. with the stand-in on port 8002:
+
+GITHUB_API_URL=http://127.0.0.1:8002 GITHUB_RAW_URL=http://127.0.0.1:8002/raw GITHUB_URL=http://127.0.0.1:8002
+
+Any username exists, and each one deterministically (for a given seed) owns the same repos and files.
+The GraphQL API isn't imitated, so benchmark with the "rest" ingestion backend.
+"""
+
+
+class Latency:
+    """
+    A latency distribution in milliseconds, written as fixed:<ms>, uniform:<min ms>,<max ms>
+    or lognormal:<median ms>,<sigma>.
+    """
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(param) for param in params.split(",") if param]
+        if kind not in ["fixed", "uniform", "lognormal"]:
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.params[0], self.params[1])
+        else:
+            ms = rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        return ms / 1000
+
+
+@dataclass
+class StandinConfig:
+    seed: int = 0
+    repos_per_user: int = 30
+    files_per_repo: int = 40
+    empty_repo_ratio: float = 0.2
+    fork_ratio: float = 0.1
+    large_file_ratio: float = 0.05
+    api_latency: Latency = field(default_factory=lambda: Latency("lognormal:80,0.5"))
+    raw_latency: Latency = field(default_factory=lambda: Latency("lognormal:40,0.5"))
+    error_rate: float = 0.0
+    rate_limit: int = 5000
+    rate_limit_window: int = 3600
+    callback_url: str = "http://127.0.0.1:8001/auth/gh"
+
+
+EXTENSIONS = ["py", "js", "ts", "go", "java", "cpp", "md", "json", "png"]
+CREATED_AT = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+class Fixtures:
+    def __init__(self, config: StandinConfig):
+        self.config = config
+
+    def __rng(self, *keys: str):
+        return random.Random(":".join([str(self.config.seed), *keys]))
+
+    def get_repos(self, username: str):
+        rng = self.__rng(username)
+        repos = []
+        for i in range(self.config.repos_per_user):
+            is_empty = rng.random() < self.config.empty_repo_ratio
+            repos.append(
+                {
+                    "full_name": f"{username}/repo-{i}",
+                    "fork": rng.random() < self.config.fork_ratio,
+                    "size": 0 if is_empty else rng.randint(1, 5000),
+                    "pushed_at": (CREATED_AT + timedelta(days=i)).isoformat(),
+                    "default_branch": "main",
+                }
+            )
+        return repos
+
+    def get_files(self, full_repo_name: str):
+        rng = self.__rng(full_repo_name)
+        files = {}
+        for i in range(self.config.files_per_repo):
+            extension = rng.choice(EXTENSIONS)
+            size = rng.randint(200, 8000)
+            if rng.random() < self.config.large_file_ratio:
+                size = rng.randint(16000, 60000)
+            files[f"src/pkg_{i % 4}/module_{i}.{extension}"] = size
+        return files
+
+    def get_content(self, full_repo_name: str, path: str):
+        size = self.get_files(full_repo_name)[path]
+        if path.endswith(".png"):
+            return bytes(
+                self.__rng(full_repo_name, path).getrandbits(8) for _ in range(size)
+            )
+        line = f"// {full_repo_name}/{path} synthetic line\n"
+        return (line * (size // len(line) + 1))[:size].encode()
+
+
+class RateLimiter:
+    def __init__(self, config: StandinConfig):
+        self.config = config
+        self.used = 0
+        self.reset = time.time() + config.rate_limit_window
+
+    def roll_over(self):
+        if time.time() >= self.reset:
+            self.used = 0
+            self.reset = time.time() + self.config.rate_limit_window
+
+    @property
+    def remaining(self):
+        return max(self.config.rate_limit - self.used, 0)
+
+    def get_headers(self):
+        return {
+            "x-ratelimit-limit": str(self.config.rate_limit),
+            "x-ratelimit-remaining": str(self.remaining),
+            "x-ratelimit-used": str(self.used),
+            "x-ratelimit-reset": str(int(self.reset)),
+            "x-ratelimit-resource": "core",
+        }
+
+
+def get_etag(body: bytes):
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def conditional_json(request: Request, data, headers: dict | None = None):
+    body = json.dumps(data, default=str).encode()
+    etag = get_etag(body)
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"etag": etag}
+        )
+    return Response(
+        body,
+        media_type="application/json",
+        headers={"etag": etag, **(headers or {})},
+    )
+
+
+def create_app(config: StandinConfig):
+    app = FastAPI()
+    fixtures = Fixtures(config)
+    rate_limiter = RateLimiter(config)
+    rng = random.Random(config.seed)
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        is_raw = request.url.path.startswith("/raw/")
+        latency = config.raw_latency if is_raw else config.api_latency
+        await asyncio.sleep(latency.sample(rng))
+        if rng.random() < config.error_rate:
+            return JSONResponse(
+                {"message": "Injected failure"}, status.HTTP_502_BAD_GATEWAY
+            )
+        if is_raw or request.url.path.startswith("/login/"):
+            return await call_next(request)
+
+        rate_limiter.roll_over()
+        if rate_limiter.remaining == 0:
+            return JSONResponse(
+                {"message": "API rate limit exceeded"},
+                status.HTTP_403_FORBIDDEN,
+                headers=rate_limiter.get_headers(),
+            )
+        response = await call_next(request)
+        # like Github, conditional requests answered with a 304 don't count against the rate limit
+        if (
+            response.status_code != status.HTTP_304_NOT_MODIFIED
+            and request.url.path != "/rate_limit"
+        ):
+            rate_limiter.used += 1
+        response.headers.update(rate_limiter.get_headers())
+        return response
+
+    @app.get("/rate_limit")
+    async def get_rate_limit():
+        core = {
+            "limit": config.rate_limit,
+            "used": rate_limiter.used,
+            "remaining": rate_limiter.remaining,
+            "reset": int(rate_limiter.reset),
+        }
+        return {"resources": {"core": core}, "rate": core}
+
+    @app.get("/users/{username}/repos")
+    async def get_repos(
+        request: Request, username: str, per_page: int = 30, page: int = 1
+    ):
+        repos = fixtures.get_repos(username)
+        start = (page - 1) * per_page
+        headers = {}
+        if start + per_page < len(repos):
+            params = {**request.query_params, "page": page + 1}
+            headers[
+                "link"
+            ] = f'<{request.url.replace_query_params(**params)}>; rel="next"'
+        return conditional_json(request, repos[start : start + per_page], headers)
+
+    @app.get("/repos/{owner}/{repo}/git/trees/{branch}")
+    async def get_tree(request: Request, owner: str, repo: str, branch: str):
+        full_repo_name = f"{owner}/{repo}"
+        tree = []
+        for path in fixtures.get_files(full_repo_name):
+            content = fixtures.get_content(full_repo_name, path)
+            tree.append(
+                {
+                    "path": path,
+                    "type": "blob",
+                    "size": len(content),
+                    "sha": get_blob_sha(content),
+                }
+            )
+        return conditional_json(
+            request, {"sha": branch, "tree": tree, "truncated": False}
+        )
+
+    @app.get("/repos/{owner}/{repo}/tarball/{branch}")
+    async def get_tarball(owner: str, repo: str, branch: str):
+        full_repo_name = f"{owner}/{repo}"
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tarball:
+            for path in fixtures.get_files(full_repo_name):
+                content = fixtures.get_content(full_repo_name, path)
+                member = tarfile.TarInfo(f"{owner}-{repo}-{branch}/{path}")
+                member.size = len(content)
+                tarball.addfile(member, io.BytesIO(content))
+        return Response(
+            gzip.compress(buffer.getvalue()), media_type="application/x-gzip"
+        )
+
+    @app.get("/raw/{owner}/{repo}/{branch}/{path:path}")
+    async def get_raw(owner: str, repo: str, branch: str, path: str):
+        full_repo_name = f"{owner}/{repo}"
+        if path not in fixtures.get_files(full_repo_name):
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        return Response(
+            fixtures.get_content(full_repo_name, path), media_type="text/plain"
+        )
+
+    @app.get("/user")
+    async def get_user(request: Request):
+        # tokens handed out by the stand-in's oauth flow are 'standin-<username>'
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        username = (
+            token.removeprefix("standin-")
+            if token.startswith("standin-")
+            else "octocat"
+        )
+        return {"login": username, "name": username, "node_id": f"standin-{username}"}
+
+    @app.post("/repos/{owner}/{repo}/issues", status_code=status.HTTP_201_CREATED)
+    async def create_issue():
+        return {"number": 1}
+
+    @app.get("/login/oauth/authorize")
+    async def authorize(state: str, login: str = "octocat"):
+        return RedirectResponse(
+            f"{config.callback_url}?{urlencode({'state': state, 'code': login})}"
+        )
+
+    @app.post("/login/oauth/access_token")
+    async def get_access_token(request: Request):
+        payload = await request.json()
+        return {"access_token": f"standin-{payload['code']}", "token_type": "bearer"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="An offline Github stand-in for benchmarking the Gitgame API"
+    )
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repos-per-user", type=int, default=30)
+    parser.add_argument("--files-per-repo", type=int, default=40)
+    parser.add_argument("--empty-repo-ratio", type=float, default=0.2)
+    parser.add_argument(
+        "--api-latency", type=Latency, default=Latency("lognormal:80,0.5")
+    )
+    parser.add_argument(
+        "--raw-latency", type=Latency, default=Latency("lognormal:40,0.5")
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=5000)
+    parser.add_argument("--rate-limit-window", type=int, default=3600)
+    parser.add_argument("--callback-url", default="http://127.0.0.1:8001/auth/gh")
+    args = parser.parse_args(sys.argv[1:])
+    config = StandinConfig(
+        seed=args.seed,
+        repos_per_user=args.repos_per_user,
+        files_per_repo=args.files_per_repo,
+        empty_repo_ratio=args.empty_repo_ratio,
+        api_latency=args.api_latency,
+        raw_latency=args.raw_latency,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        rate_limit_window=args.rate_limit_window,
+        callback_url=args.callback_url,
+    )
+    uvicorn.run(create_app(config), port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import statistics
+import sys
+import time
+import anyio
+from nanoid import generate
+from tortoise import Tortoise
+from config import DB_URI
+from db import crud, models
+from db.engine import get_tortoise_config
+from deps import (
+    get_gh_blob_cache,
+    get_gh_pool,
+    get_gh_response_cache,
+    get_gh_scheduler,
+    get_gh_single_flight,
+)
+from services.github.client import GithubClient
+
+"""
+Times crud.join and crud.advance end to end against Github, or rather against bench/github_standin.py when
+GITHUB_API_URL, GITHUB_RAW_URL and GITHUB_URL point at it. Run from the api directory, i.e.
+
+python -m bench.session_bench --sessions 10 --players 4 --rounds 20
+
+Every session's players join concurrently, then the rounds are advanced one after another.
+The sessions it creates are left in the DB, so point DB_URI at a scratch database.
+"""
+
+
+def get_gh_client(username: str):
+    return GithubClient(
+        f"standin-{username}",
+        get_gh_pool().client,
+        get_gh_response_cache(),
+        get_gh_blob_cache(),
+        get_gh_scheduler(),
+        get_gh_single_flight(),
+    )
+
+
+def summarize(name: str, timings: list[float]):
+    if len(timings) == 0:
+        print(f"{name}: no samples")
+        return
+    ordered = sorted(timings)
+    percentile = lambda p: ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000
+    print(
+        f"{name}: n={len(ordered)} mean={statistics.mean(ordered) * 1000:.1f}ms "
+        f"p50={percentile(0.5):.1f}ms p95={percentile(0.95):.1f}ms p99={percentile(0.99):.1f}ms"
+    )
+
+
+async def run_session(
+    args: argparse.Namespace, join_timings: list[float], advance_timings: list[float]
+):
+    session = await models.Session.create(id=generate(size=10))
+
+    async def join(username: str):
+        start = time.perf_counter()
+        if await crud.join(session.id, username):
+            await crud.load_player_files(session.id, username, get_gh_client(username))
+        join_timings.append(time.perf_counter() - start)
+
+    async with anyio.create_task_group() as tg:
+        for i in range(args.players):
+            tg.start_soon(join, f"{args.user_prefix}{session.id}-{i}")
+
+    gh_client = get_gh_client(f"{args.user_prefix}{session.id}-0")
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        session = await crud.advance(session.id, gh_client)
+        advance_timings.append(time.perf_counter() - start)
+        if session.is_terminated:
+            break
+
+
+async def main(args: argparse.Namespace):
+    await Tortoise.init(config=get_tortoise_config(args.db_uri))
+    await Tortoise.generate_schemas()
+    join_timings: list[float] = []
+    advance_timings: list[float] = []
+    start = time.perf_counter()
+    try:
+        async with anyio.create_task_group() as tg:
+            for _ in range(args.sessions):
+                tg.start_soon(run_session, args, join_timings, advance_timings)
+    finally:
+        await get_gh_pool().close()
+        await Tortoise.close_connections()
+    print(f"Ran {args.sessions} sessions in {time.perf_counter() - start:.2f}s")
+    summarize("join", join_timings)
+    summarize("advance", advance_timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark joining and advancing sessions"
+    )
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--user-prefix", default="bench-")
+    parser.add_argument("--db-uri", default=DB_URI)
+    anyio.run(main, parser.parse_args(sys.argv[1:]))
@@ -2,8 +2,10 @@ import argparse
 import sys
 import anyio
 import asyncpg
+from httpx import AsyncClient
 from services.github.client import GithubClient
 from config import DB_URI, GITHUB_ACCESS_TOKEN
+from db.migrations import migrate
 
 
 def drop_tables(args: argparse.Namespace):
@@ -40,10 +42,26 @@ def delete_rows(args: argparse.Namespace):
     print("Successfully deleted all rows!")
 
 
+def run_migrations(args: argparse.Namespace):
+    async def run_pending_migrations(db_uri: str):
+        db_conn = await asyncpg.connect(db_uri)
+        try:
+            return await migrate(db_conn)
+        finally:
+            await db_conn.close()
+
+    resolved_db_uri = DB_URI.replace("host.docker.internal", "localhost")
+    applied = anyio.run(run_pending_migrations, resolved_db_uri)
+    for migration in applied:
+        print(f"Applied migration {migration.version} {migration.name}")
+    print(f"Successfully applied {len(applied)} migrations!")
+
+
 def display_gh_rate_limit(args: argparse.Namespace):
     async def display_rate_limit():
-        gh_client = GithubClient(GITHUB_ACCESS_TOKEN)
-        rate_limit_result = await gh_client.get_rate_limit()
+        async with AsyncClient() as http_client:
+            gh_client = GithubClient(GITHUB_ACCESS_TOKEN, http_client)
+            rate_limit_result = await gh_client.get_rate_limit()
         print(
             f"{rate_limit_result['used']} requests used out of {rate_limit_result['limit']}."
         )
@@ -66,6 +84,10 @@ def main():
     command_map = {
         "drop_tables": {"help": "Drops all the database tables", "func": drop_tables},
         "delete_rows": {"help": "Deletes all database table rows", "func": delete_rows},
+        "migrate": {
+            "help": "Applies the pending database migrations",
+            "func": run_migrations,
+        },
         "show_rate_limit": {
             "help": "Displays the Github rate limit",
             "func": display_gh_rate_limit,
@@ -11,3 +11,107 @@ GITHUB_CLIENT_SECRET = os.environ.get("GITHUB_CLIENT_SECRET")
 AUTH_SECRET = os.environ.get("AUTH_SECRET")
 CLIENT_URL = os.environ.get("CLIENT_URL")
 DISABLE_AUTH = os.environ.get("DISABLE_AUTH")
+
+# the Postgres connection pool of each worker, and how long (in seconds) a checkout waits for a connection to free up
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 20))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", 10.0))
+# idle connections are closed after this many seconds, and connections are replaced after this many queries
+DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME = float(
+    os.environ.get("DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME", 300.0)
+)
+DB_POOL_MAX_QUERIES = int(os.environ.get("DB_POOL_MAX_QUERIES", 50000))
+# prepared statements cached per connection, set it to 0 behind pgbouncer in transaction pooling mode
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+DB_COMMAND_TIMEOUT = float(os.environ.get("DB_COMMAND_TIMEOUT", 60.0))
+
+GITHUB_POOL_MAX_CONNECTIONS = int(os.environ.get("GITHUB_POOL_MAX_CONNECTIONS", 100))
+GITHUB_POOL_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("GITHUB_POOL_MAX_KEEPALIVE_CONNECTIONS", 20)
+)
+GITHUB_POOL_KEEPALIVE_EXPIRY = float(
+    os.environ.get("GITHUB_POOL_KEEPALIVE_EXPIRY", 30.0)
+)
+GITHUB_POOL_CONNECT_TIMEOUT = float(os.environ.get("GITHUB_POOL_CONNECT_TIMEOUT", 5.0))
+GITHUB_POOL_READ_TIMEOUT = float(os.environ.get("GITHUB_POOL_READ_TIMEOUT", 10.0))
+GITHUB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("GITHUB_POOL_ACQUIRE_TIMEOUT", 5.0))
+GITHUB_POOL_HTTP2 = os.environ.get("GITHUB_POOL_HTTP2", "true").lower() == "true"
+
+GITHUB_RESPONSE_CACHE_MAX_ENTRIES = int(
+    os.environ.get("GITHUB_RESPONSE_CACHE_MAX_ENTRIES", 256)
+)
+# the size of the responses (as JSON) the memory cache holds at most
+GITHUB_RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("GITHUB_RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+)
+# how long (in seconds) the shared cache keeps a response that wasn't rewritten
+GITHUB_RESPONSE_CACHE_MAX_AGE = int(
+    os.environ.get("GITHUB_RESPONSE_CACHE_MAX_AGE", 7 * 24 * 60 * 60)
+)
+# "memory" keeps the cache per worker, "postgres" additionally shares it between workers
+GITHUB_RESPONSE_CACHE_BACKEND = os.environ.get(
+    "GITHUB_RESPONSE_CACHE_BACKEND", "memory"
+)
+
+GITHUB_BLOB_CACHE_MEMORY_BYTES = int(
+    os.environ.get("GITHUB_BLOB_CACHE_MEMORY_BYTES", 32 * 1024 * 1024)
+)
+# the disk tier is disabled unless a directory is configured
+GITHUB_BLOB_CACHE_DIR = os.environ.get("GITHUB_BLOB_CACHE_DIR")
+GITHUB_BLOB_CACHE_DISK_BYTES = int(
+    os.environ.get("GITHUB_BLOB_CACHE_DISK_BYTES", 1024 * 1024 * 1024)
+)
+
+# the Github API quota each priority must leave untouched, critical-path requests may use all of it
+GITHUB_SCHEDULER_INTERACTIVE_RESERVE = int(
+    os.environ.get("GITHUB_SCHEDULER_INTERACTIVE_RESERVE", 100)
+)
+GITHUB_SCHEDULER_BACKGROUND_RESERVE = int(
+    os.environ.get("GITHUB_SCHEDULER_BACKGROUND_RESERVE", 500)
+)
+GITHUB_SCHEDULER_MAX_WAIT = float(os.environ.get("GITHUB_SCHEDULER_MAX_WAIT", 30.0))
+
+# how long (in seconds) a user's listed repos are trusted before they are listed again on join
+REPO_CATALOGUE_MAX_AGE = int(os.environ.get("REPO_CATALOGUE_MAX_AGE", 24 * 60 * 60))
+
+# how long (in seconds) a repo whose files failed to be listed is left alone before listing them is tried again
+REPO_FILES_RETRY_INTERVAL = int(os.environ.get("REPO_FILES_RETRY_INTERVAL", 60 * 60))
+
+# a player's next batch of repos is loaded in the background once their unplayed files in a pool are down to this many
+POOL_LOW_WATERMARK = int(os.environ.get("POOL_LOW_WATERMARK", 3))
+
+# how many repository trees are fetched at once while loading a player's files
+REPO_LOAD_CONCURRENCY = int(os.environ.get("REPO_LOAD_CONCURRENCY", 5))
+
+# "rest" lists repos and trees one request at a time, "graphql" batches them into far fewer queries
+GITHUB_INGESTION_BACKEND = os.environ.get("GITHUB_INGESTION_BACKEND", "rest")
+GITHUB_GRAPHQL_PAGE_SIZE = int(os.environ.get("GITHUB_GRAPHQL_PAGE_SIZE", 25))
+
+# downloads each repo once as a tarball (capped in size) into the blob cache, instead of its tree and then file by file.
+# The files are only cached on disk, so it needs GITHUB_BLOB_CACHE_DIR to be set
+GITHUB_TARBALL_INGESTION = (
+    os.environ.get("GITHUB_TARBALL_INGESTION", "false").lower() == "true"
+)
+GITHUB_TARBALL_MAX_BYTES = int(
+    os.environ.get("GITHUB_TARBALL_MAX_BYTES", 20 * 1024 * 1024)
+)
+
+# how many repos, files or pool entries are held in memory and copied into the DB at a time while loading files
+INGESTION_BATCH_SIZE = int(os.environ.get("INGESTION_BATCH_SIZE", 1000))
+
+# point these at a stand-in (see bench/github_standin.py) to benchmark without touching Github
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+GITHUB_RAW_URL = os.environ.get("GITHUB_RAW_URL", "https://raw.githubusercontent.com")
+GITHUB_URL = os.environ.get("GITHUB_URL", "https://github.com")
+
+# how often (in seconds) readiness and comments held in memory are written to the DB,
+# and how long a session's in-memory state is kept after it was last touched
+SESSION_STATE_FLUSH_INTERVAL = float(
+    os.environ.get("SESSION_STATE_FLUSH_INTERVAL", 0.5)
+)
+SESSION_STATE_IDLE_TIMEOUT = float(os.environ.get("SESSION_STATE_IDLE_TIMEOUT", 300))
+
+# compresses Websocket messages with permessage-deflate for clients that offer it, as browsers do
+WS_PER_MESSAGE_DEFLATE = (
+    os.environ.get("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+)
@@ -1,3 +1,5 @@
 import db.crud as Crud
 import db.models as Models
 import db.views as Views
+import db.caches as Caches
+import db.state as State
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+from tortoise import timezone
+from services.github.cache import CachedResponse, ResponseCache
+from .models import GithubResponse
+
+# how often (in seconds) a worker deletes the responses that outlived their max age
+PRUNE_INTERVAL = 60 * 60
+
+
+class PostgresResponseCache(ResponseCache):
+    # Responses that weren't rewritten for max_age seconds are deleted by the worker writing a response once
+    # PRUNE_INTERVAL passed since it last did, so that responses of users who never come back don't pile up.
+    def __init__(self, max_age: int):
+        self.__max_age = timedelta(seconds=max_age)
+        self.__pruned_at: float | None = None
+
+    async def get(self, key: str) -> CachedResponse | None:
+        row = await GithubResponse.get_or_none(key=key)
+        if row is None:
+            return None
+        return CachedResponse(
+            etag=row.etag, last_modified=row.last_modified, link=row.link, body=row.body
+        )
+
+    async def put(self, key: str, response: CachedResponse):
+        await GithubResponse.update_or_create(
+            key=key,
+            defaults={
+                "etag": response["etag"],
+                "last_modified": response["last_modified"],
+                "link": response["link"],
+                "body": response["body"],
+            },
+        )
+        now = time.monotonic()
+        if self.__pruned_at is None or now - self.__pruned_at >= PRUNE_INTERVAL:
+            self.__pruned_at = now
+            await self.prune()
+
+    async def prune(self):
+        await GithubResponse.filter(
+            updated_at__lt=timezone.now() - self.__max_age
+        ).delete()
@@ -1,11 +1,46 @@
+import anyio
 import logging
 import random
+from collections import defaultdict
 from contextlib import asynccontextmanager
+from itertools import zip_longest
+from datetime import timedelta
+from tortoise import timezone
 from tortoise.functions import Count
 from tortoise.transactions import in_transaction
-from services.github.client import GithubClient, GithubApiException
-from .models import Session, Player, SourceCode, File, Repository, Comment
-from uuid import UUID
+from config import (
+    POOL_LOW_WATERMARK,
+    REPO_CATALOGUE_MAX_AGE,
+    REPO_FILES_RETRY_INTERVAL,
+    REPO_LOAD_CONCURRENCY,
+    GITHUB_INGESTION_BACKEND,
+    GITHUB_GRAPHQL_PAGE_SIZE,
+    GITHUB_TARBALL_INGESTION,
+    GITHUB_TARBALL_MAX_BYTES,
+)
+from services.github.client import (
+    GithubClient,
+    GithubApiException,
+    FileDict,
+    RepositoryDict,
+    TarballTooLargeError,
+    UnsupportedFileError,
+)
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Subquery
+from services.github.scheduler import Priority
+from .ingestion import copy_upsert
+from .models import (
+    Session,
+    Player,
+    Author,
+    PoolFile,
+    SourceCode,
+    StagedCode,
+    File,
+    Repository,
+)
+from uuid import UUID, uuid4
 
 LOGGER = logging.getLogger()
 
@@ -15,7 +50,10 @@ class DBCrudException(Exception):
 
 
 class PlayerRejoiningError(DBCrudException):
-    pass
+    def __init__(self, is_loading_files: bool = False):
+        super().__init__()
+        # whether the player's files are still to be loaded, as their other connection may have died while loading
+        self.is_loading_files = is_loading_files
 
 
 class NoSelectedCodeError(DBCrudException):
@@ -33,21 +71,6 @@ async def __session_lock(session_id: str) -> Session:
         return
 
 
-async def __load_repos(author_id: UUID, gh_client: GithubClient):
-    author = await Player.get(id=author_id)
-    repo_dicts, _ = await gh_client.get_non_forked_repos(author.username)
-    repos = []
-    for repo_dict in repo_dicts:
-        repos.append(
-            Repository(
-                **repo_dict,
-                author_id=author.id,
-            )
-        )
-
-    await Repository.bulk_create(repos)
-
-
 REPO_LOAD_BATCH_SIZE = 5
 SUPPORTED_LANGUAGE_EXTENSIONS = [
     "py",
@@ -65,156 +88,509 @@ SUPPORTED_LANGUAGE_EXTENSIONS = [
 ]
 
 
-async def __load_files(session_id: str, author_id: UUID, gh_client: GithubClient):
-    async with in_transaction():
-        repos = await Repository.filter(author_id=author_id, is_loaded=False).order_by(
-            "last_pushed_at"
+def __is_graphql_ingestion():
+    return GITHUB_INGESTION_BACKEND == "graphql"
+
+
+def __should_list_files(repo: Repository):
+    # repos whose listing failed aren't listed again by every player loading files until REPO_FILES_RETRY_INTERVAL
+    # passed, their files (if any were listed before) are drawn meanwhile
+    if repo.are_files_fresh:
+        return False
+    return (
+        repo.files_failed_at is None
+        or timezone.now() - repo.files_failed_at
+        >= timedelta(seconds=REPO_FILES_RETRY_INTERVAL)
+    )
+
+
+async def __upsert_repos(author_id: str, repo_dicts: list[RepositoryDict]):
+    # the catalogue is shared between sessions, so the same user joining two of them at once upserts the same repos
+    await copy_upsert(
+        Repository,
+        ["id", "name", "default_branch", "last_pushed_at", "author_id"],
+        (
+            (
+                uuid4(),
+                repo_dict["name"],
+                repo_dict["default_branch"],
+                repo_dict["last_pushed_at"],
+                author_id,
+            )
+            for repo_dict in repo_dicts
+        ),
+        conflict_columns=["name"],
+        update_columns=["default_branch", "last_pushed_at"],
+    )
+
+
+async def __prune_repos(author_id: str, repo_dicts: list[RepositoryDict]):
+    # Repos missing from a full listing of the author's repos were deleted, renamed, made private or emptied. They
+    # leave the catalogue with their files, unless a session is showing or staging one of their files.
+    shown_file_ids = Subquery(SourceCode.all().values("file_id"))
+    staged_file_ids = Subquery(StagedCode.all().values("file_id"))
+    await (
+        Repository.filter(author_id=author_id)
+        .exclude(name__in=[repo_dict["name"] for repo_dict in repo_dicts])
+        .exclude(id__in=Subquery(File.filter(id__in=shown_file_ids).values("repo_id")))
+        .exclude(id__in=Subquery(File.filter(id__in=staged_file_ids).values("repo_id")))
+        .delete()
+    )
+
+
+async def __upsert_files(repos_with_files: list[tuple[Repository, list[FileDict]]]):
+    if len(repos_with_files) == 0:
+        return
+    # files listed again are given another chance to be played, as they may have changed since they were skipped
+    await copy_upsert(
+        File,
+        [
+            "id",
+            "path",
+            "download_url",
+            "visit_url",
+            "sha",
+            "is_playable",
+            "repo_id",
+            "author_id",
+        ],
+        (
+            (
+                uuid4(),
+                file_dict["path"],
+                file_dict["download_url"],
+                file_dict["visit_url"],
+                file_dict["sha"],
+                True,
+                repo.id,
+                repo.author_id,
+            )
+            for repo, file_dicts in repos_with_files
+            for file_dict in file_dicts
+        ),
+        conflict_columns=["repo_id", "path"],
+        update_columns=["download_url", "visit_url", "sha", "is_playable"],
+    )
+    for repo, file_dicts in repos_with_files:
+        # files that are gone from the repo leave the catalogue, unless a session is showing or staging them
+        await (
+            File.filter(repo_id=repo.id)
+            .exclude(path__in=[file_dict["path"] for file_dict in file_dicts])
+            .exclude(id__in=Subquery(SourceCode.all().values("file_id")))
+            .exclude(id__in=Subquery(StagedCode.all().values("file_id")))
+            .delete()
         )
-        non_empty_repos = 0
-        loaded_repos = []
-        files = []
-        for repo in repos:
+    await Repository.filter(id__in=[repo.id for repo, _ in repos_with_files]).update(
+        files_refreshed_at=timezone.now(), files_failed_at=None
+    )
+
+
+async def __refresh_repos(author: Author, gh_client: GithubClient):
+    # lists the author's repos again once the catalogue's listing is older than REPO_CATALOGUE_MAX_AGE
+    max_age = timedelta(seconds=REPO_CATALOGUE_MAX_AGE)
+    if (
+        author.repos_refreshed_at is not None
+        and timezone.now() - author.repos_refreshed_at < max_age
+    ):
+        return
+    if __is_graphql_ingestion():
+        # the first page of repos comes with their trees, which spares __load_files listing them
+        repos_with_files, next_cursor = await gh_client.get_non_forked_repos_with_files(
+            author.username,
+            SUPPORTED_LANGUAGE_EXTENSIONS,
+            page_size=GITHUB_GRAPHQL_PAGE_SIZE,
+        )
+        repo_dicts = [repo_dict for repo_dict, _ in repos_with_files]
+        await __upsert_repos(author.username, repo_dicts)
+        if next_cursor is None:
+            await __prune_repos(author.username, repo_dicts)
+        repos = await Repository.filter(
+            name__in=[repo_dict["name"] for repo_dict, _ in repos_with_files]
+        )
+        repos_by_name = {repo.name: repo for repo in repos}
+        await __upsert_files(
+            [
+                (repos_by_name[repo_dict["name"]], file_dicts)
+                for repo_dict, file_dicts in repos_with_files
+                if file_dicts is not None
+            ]
+        )
+    else:
+        repo_dicts, next_page = await gh_client.get_non_forked_repos(author.username)
+        await __upsert_repos(author.username, repo_dicts)
+        if next_page is None:
+            await __prune_repos(author.username, repo_dicts)
+    author.repos_refreshed_at = timezone.now()
+    await author.save(update_fields=["repos_refreshed_at"])
+
+
+async def __get_files_for_repos(repos: list[Repository], gh_client: GithubClient):
+    # the files of a repo whose listing failed are None
+    if len(repos) == 0:
+        return []
+    if __is_graphql_ingestion():
+        try:
+            return await gh_client.get_files_for_repos(
+                [(repo.name, repo.default_branch) for repo in repos],
+                SUPPORTED_LANGUAGE_EXTENSIONS,
+            )
+        except GithubApiException as e:
+            LOGGER.exception(e)
+            return [None for _ in repos]
+
+    # fetches the trees concurrently, but hands them back in the order of the given repos
+    repo_file_dicts: list[list[FileDict] | None] = [None for _ in repos]
+
+    async def get_files_for_repo(index: int, repo: Repository):
+        try:
+            if GITHUB_TARBALL_INGESTION:
+                try:
+                    repo_file_dicts[index] = await gh_client.get_files_from_tarball(
+                        repo.name,
+                        repo.default_branch,
+                        SUPPORTED_LANGUAGE_EXTENSIONS,
+                        max_tarball_size=GITHUB_TARBALL_MAX_BYTES,
+                    )
+                    return
+                except TarballTooLargeError as e:
+                    LOGGER.info(f"{e}, falling back to its tree")
+            repo_file_dicts[index] = await gh_client.get_files_for_repo(
+                repo.name, repo.default_branch, SUPPORTED_LANGUAGE_EXTENSIONS
+            )
+        except GithubApiException as e:
+            if e.is_empty_repository:
+                repo_file_dicts[index] = []
+                return
+            LOGGER.exception(e)
+
+    async with anyio.create_task_group() as tg:
+        for index, repo in enumerate(repos):
+            tg.start_soon(get_files_for_repo, index, repo)
+    return repo_file_dicts
+
+
+async def __load_files(session_id: str, player: Player, gh_client: GithubClient):
+    # Draws the files of the player's next REPO_LOAD_BATCH_SIZE non-empty repos into the session's pool,
+    # only listing the files of repos whose catalogue entries are stale. Github is called outside of any transaction
+    # of its own, and the catalogue upserts and pool inserts tolerate the same files being loaded concurrently.
+    drawn_repo_ids = PoolFile.filter(session_id=session_id, player_id=player.id).values(
+        "repo_id"
+    )
+    repos = (
+        await Repository.filter(author_id=player.username)
+        .exclude(id__in=Subquery(drawn_repo_ids))
+        .order_by("last_pushed_at")
+    )
+    non_empty_repos = 0
+    # (file id, repo id) pairs rather than File instances, as a player's repos can have thousands of files
+    drawn_files_by_repo: dict[UUID, list[tuple[UUID, UUID]]] = {}
+    window_size = REPO_LOAD_CONCURRENCY
+    if __is_graphql_ingestion():
+        window_size = GITHUB_GRAPHQL_PAGE_SIZE
+    for start in range(0, len(repos), window_size):
+        if non_empty_repos == REPO_LOAD_BATCH_SIZE:
+            break
+        window = repos[start : start + window_size]
+        stale_repos = [repo for repo in window if __should_list_files(repo)]
+        repo_file_dicts = await __get_files_for_repos(stale_repos, gh_client)
+        failed_repo_ids = [
+            repo.id
+            for repo, file_dicts in zip(stale_repos, repo_file_dicts)
+            if file_dicts is None
+        ]
+        if len(failed_repo_ids) > 0:
+            await Repository.filter(id__in=failed_repo_ids).update(
+                files_failed_at=timezone.now()
+            )
+        await __upsert_files(
+            [
+                (repo, file_dicts)
+                for repo, file_dicts in zip(stale_repos, repo_file_dicts)
+                if file_dicts is not None
+            ]
+        )
+
+        files_by_repo: dict[UUID, list[tuple[UUID, UUID]]] = defaultdict(list)
+        for file_id, repo_id in await File.filter(
+            repo_id__in=[repo.id for repo in window], is_playable=True
+        ).values_list("id", "repo_id"):
+            files_by_repo[repo_id].append((file_id, repo_id))
+        for repo in window:
             if non_empty_repos == REPO_LOAD_BATCH_SIZE:
                 break
-            try:
-                file_dicts = await gh_client.get_files_for_repo(
-                    repo.name, repo.default_branch, SUPPORTED_LANGUAGE_EXTENSIONS
-                )
-                for file_dict in file_dicts:
-                    files.append(
-                        File(
-                            **file_dict,
-                            repo_id=repo.id,
-                            author_id=author_id,
-                            session_id=session_id,
-                        )
-                    )
-                if len(file_dicts) > 0:
-                    non_empty_repos += 1
-            except GithubApiException as e:
-                LOGGER.exception(e)
-            finally:
-                loaded_repos.append(repo.id)
+            if len(files_by_repo[repo.id]) > 0:
+                drawn_files_by_repo[repo.id] = files_by_repo[repo.id]
+                non_empty_repos += 1
 
-        await Repository.filter(id__in=loaded_repos).update(is_loaded=True)
-        await File.bulk_create(files)
+    if len(drawn_files_by_repo) == 0:
+        return
+    slot = await __get_next_slot(session_id, player.id)
+    await copy_upsert(
+        PoolFile,
+        ["id", "session_id", "player_id", "repo_id", "file_id", "position"],
+        (
+            (
+                uuid4(),
+                session_id,
+                player.id,
+                repo_id,
+                file_id,
+                slot + i + random.random(),
+            )
+            for i, (file_id, repo_id) in enumerate(
+                __interleave(list(drawn_files_by_repo.values()))
+            )
+        ),
+        conflict_columns=["session_id", "file_id"],
+    )
+
+
+def __interleave(files_by_repo: list[list[tuple[UUID, UUID]]]):
+    # shuffles the files of every repo, then takes one file of each repo at a time (in a random order of repos)
+    random.shuffle(files_by_repo)
+    for files in files_by_repo:
+        random.shuffle(files)
+    return [
+        file
+        for files in zip_longest(*files_by_repo)
+        for file in files
+        if file is not None
+    ]
+
+
+async def __get_next_slot(session_id: str, player_id: UUID):
+    # A player's files take the slots after both their own last file and the last played file. Every player's n-th
+    # file then lands around the same slot and players alternate, while files of players who joined (or had more
+    # files loaded) later don't jump the queue.
+    last_player_file = (
+        await PoolFile.filter(session_id=session_id, player_id=player_id)
+        .order_by("-position")
+        .first()
+    )
+    last_played_file = (
+        await PoolFile.filter(session_id=session_id, is_played=True)
+        .order_by("-position")
+        .first()
+    )
+    return max(
+        [
+            int(pool_file.position) + 1
+            for pool_file in [last_player_file, last_played_file]
+            if pool_file is not None
+        ],
+        default=0,
+    )
+
+
+def __get_pickable_pool(session_id: str):
+    # code of players who aren't around to see it isn't shown, until they rejoin
+    return PoolFile.filter(
+        session_id=session_id,
+        is_played=False,
+        player__is_connected=True,
+        file__is_playable=True,
+    )
 
 
 async def __has_files_to_pick(session_id: str):
-    return await File.filter(session_id=session_id).count() > 0
+    return await __get_pickable_pool(session_id).exists()
 
 
 async def __pick_next_file_for_code(session_id: str):
-    authors = (
-        await File.filter(session_id=session_id)
-        .annotate(count=Count("id"))
-        .group_by("author_id")
-        .values_list("author_id")
+    pool_file = (
+        await __get_pickable_pool(session_id)
+        .order_by("position")
+        .select_related("file")
+        .first()
     )
-    author_id: str = random.choice(authors)[0]
-    repos = (
-        await File.filter(author_id=author_id)
-        .annotate(count=Count("id"))
-        .group_by("repo_id")
-        .values_list("repo_id")
-    )
-    repo_id: str = random.choice(repos)[0]
-    files = await File.filter(author_id=author_id, repo_id=repo_id).all()
-    return random.choice(files)
+    if pool_file is None:
+        return None
+    return pool_file.file
+
+
+async def __pick_and_download_next_code(
+    session_id: str,
+    gh_client: GithubClient,
+    priority: Priority = Priority.CRITICAL,
+):
+    # Files that turn out to be unsupported once downloaded, or that were deleted from their repo since it was
+    # listed, are marked unplayable rather than deleted, as the catalogue's files are shared with other sessions
+    # which may be showing them. Another file is picked then.
+    while True:
+        file = await __pick_next_file_for_code(session_id)
+        if file is None:
+            return None, None
+        try:
+            content = await gh_client.download_file_from_url(
+                file.download_url, file.sha, priority
+            )
+            return file, content
+        except UnsupportedFileError as e:
+            LOGGER.info(f"Skipping {file.name} for {session_id}: {e}")
+            await File.filter(id=file.id).update(is_playable=False)
+        except GithubApiException as e:
+            if not e.is_not_found:
+                raise e
+            LOGGER.info(f"Skipping {file.name} for {session_id}, it is gone: {e}")
+            await File.filter(id=file.id).update(is_playable=False)
 
 
 async def __remove_current_code(session_id: str):
-    code = await SourceCode.get_or_none(session_id=session_id)
-    if code is not None:
-        await code.file.delete()
+    await SourceCode.filter(session_id=session_id).delete()
 
 
-async def join(session_id: str, player_name: str, gh_client: GithubClient):
+async def join(session_id: str, player_name: str):
+    # The first phase of joining, which registers the player under the session lock. Returns whether the player's
+    # files still have to be loaded into the pool with load_player_files, which talks to Github without the lock.
     async with __session_lock(session_id):
         player = await Player.get_or_none(username=player_name, session_id=session_id)
         if player is not None:
             if player.is_connected:
-                raise PlayerRejoiningError()
+                raise PlayerRejoiningError(player.is_loading_files)
             else:
                 player.is_connected = True
                 player.is_ready = False
-                await player.save(update_fields=["is_connected", "is_ready"])
         else:
-            player = await Player.create(session_id=session_id, username=player_name)
-            await __load_repos(player.id, gh_client)
-            await __load_files(session_id, player.id, gh_client)
+            player = Player(session_id=session_id, username=player_name)
+        # a player who was disconnected before their files were loaded gets another go at loading them
+        player.is_loading_files = not await PoolFile.exists(
+            session_id=session_id, player_id=player.id
+        )
+        await player.save()
+        return player.is_loading_files
+
+
+async def load_player_files(session_id: str, player_name: str, gh_client: GithubClient):
+    # the second phase of joining, which draws the player's files into the session's pool
+    player = await Player.get(session_id=session_id, username=player_name)
+    await Author.bulk_create([Author(username=player_name)], ignore_conflicts=True)
+    author = await Author.get(username=player_name)
+    await __refresh_repos(author, gh_client)
+    await __load_files(session_id, player, gh_client)
+    await Player.filter(id=player.id, is_connected=True).update(is_loading_files=False)
 
 
 async def leave(session_id: str, player_name: str):
     async with __session_lock(session_id):
-        player = await Player.get_or_none(username=player_name, session_id=session_id)
-        if player is not None and player.is_connected:
-            player.is_connected = False
-            await player.save(update_fields=["is_connected"])
+        player = (
+            await Player.filter(username=player_name, session_id=session_id)
+            .select_for_update()
+            .get_or_none()
+        )
+        if player is None or not player.is_connected:
+            return
+        await Player.filter(id=player.id).update(
+            is_connected=False, is_ready=False, is_loading_files=False
+        )
+        # the next round shouldn't show code from someone who isn't around to see it
+        player_file_ids = PoolFile.filter(
+            session_id=session_id, player_id=player.id
+        ).values("file_id")
+        await StagedCode.filter(
+            session_id=session_id, file_id__in=Subquery(player_file_ids)
+        ).delete()
+
+
+async def __advance_code(session_id: str, gh_client: GithubClient):
+    # replaces the current code with the next file of the pool, returns False if the pool ran out
+    await __remove_current_code(session_id)
+    is_file_pool_empty = not (await __has_files_to_pick(session_id))
+    if is_file_pool_empty:
+        return False
+
+    staged_code = await StagedCode.get_or_none(session_id=session_id)
+    if staged_code is not None:
+        # the next file was already picked and downloaded while the last round was played
+        file = await staged_code.file
+        content = staged_code.content
+        await staged_code.delete()
+    else:
+        # download and persist the code to the DB
+        file, content = await __pick_and_download_next_code(session_id, gh_client)
+        if file is None:
+            return False
+    LOGGER.info(f"Picked {file.name} for {session_id} from author {file.author_id}")
+    await PoolFile.filter(session_id=session_id, file_id=file.id).update(is_played=True)
+    await SourceCode.create(content=content, session_id=session_id, file=file)
+    return True
+
+
+async def __lock_session(session_id: str):
+    # Serializes advancing with staging the next code. Staging then either commits before the advance starts,
+    # which picks the staged code up, or checks the file against the advance's committed outcome.
+    await Session.filter(id=session_id).select_for_update().get()
 
 
 async def advance(session_id: str, gh_client: GithubClient):
+    if not await __has_files_to_pick(session_id):
+        # replenish_pool usually keeps ahead of the rounds, loading inline is a last resort before finishing.
+        # It talks to Github, so it happens before the transaction rather than while holding its connection.
+        await replenish_pool(session_id, gh_client, low_watermark=0)
     async with in_transaction():
+        await __lock_session(session_id)
         await Player.filter(session_id=session_id, is_connected=True).update(
             is_ready=False
         )
-        await __remove_current_code(session_id)
-        is_file_pool_empty = not (await __has_files_to_pick(session_id))
-        if is_file_pool_empty:
+        if not await __advance_code(session_id, gh_client):
             await Session.filter(id=session_id).update(is_terminated=True)
-            return
+        return await Session.get(id=session_id)
 
-        file = await __pick_next_file_for_code(session_id)
-        # download and persist the code to the DB
-        content = await gh_client.download_file_from_url(file.download_url)
-        LOGGER.info(f"Picked {file.name} for {session_id} from author {file.author_id}")
-        await SourceCode.create(content=content, session_id=session_id, file=file)
-        files_remaining_in_pool = await File.filter(author_id=file.author_id).count()
-        if files_remaining_in_pool == 1:
-            await __load_files(session_id, file.author_id, gh_client)
 
+async def replenish_pool(
+    session_id: str, gh_client: GithubClient, low_watermark: int = POOL_LOW_WATERMARK
+):
+    # Loads the next batch of repos of every player whose unplayed files in the pool are down to the low watermark.
+    # Runs in the background after advancing, so that rounds don't wait on Github listing trees.
+    players = await Player.filter(
+        session_id=session_id, is_connected=True, is_loading_files=False
+    )
+    remaining_files = dict(
+        await PoolFile.filter(session_id=session_id, is_played=False)
+        .annotate(count=Count("id"))
+        .group_by("player_id")
+        .values_list("player_id", "count")
+    )
+    for player in players:
+        if remaining_files.get(player.id, 0) <= low_watermark:
+            await __load_files(session_id, player, gh_client)
+
+
+async def stage_next_code(session_id: str, gh_client: GithubClient):
+    # Picks and downloads the file for the round after the current one, so that advancing doesn't wait on Github.
+    # The staged code is dropped when its file leaves the catalogue (cascade) or its author leaves the session.
+    if await StagedCode.exists(session_id=session_id):
+        return
+    file, content = await __pick_and_download_next_code(
+        session_id, gh_client, Priority.INTERACTIVE
+    )
+    if file is None:
+        return
 
-async def add_comment(
-    session_id: str,
-    content: str,
-    line_start: int,
-    line_end: int,
-    type: Comment.Type,
-    author_name: str,
-) -> str:
     async with in_transaction():
-        author = await Player.get(session_id=session_id, username=author_name)
-        code = await SourceCode.get_or_none(session_id=session_id)
-        if code is None:
-            raise NoSelectedCodeError()
-        comment = await Comment.create(
-            line_start=line_start,
-            line_end=line_end,
-            content=content,
-            type=type,
-            author_id=author.id,
-            source_code_id=code.id,
+        # the session may have advanced to the file, or its author left, while we were downloading
+        await __lock_session(session_id)
+        is_pickable = await PoolFile.exists(
+            session_id=session_id,
+            file_id=file.id,
+            is_played=False,
+            player__is_connected=True,
         )
-        return str(comment.id)
+        if not is_pickable:
+            return
+        try:
+            await StagedCode.create(content=content, session_id=session_id, file=file)
+        except IntegrityError:
+            # a file was already staged (or this one left the catalogue) in the meantime
+            pass
 
 
 async def ready_up(session_id: str, player_name: str):
-    await Player.filter(session_id=session_id, username=player_name).update(
-        is_ready=True
-    )
+    await Player.filter(
+        session_id=session_id, username=player_name, is_connected=True
+    ).update(is_ready=True)
 
 
 async def wait(session_id: str, player_name: str):
-    await Player.filter(session_id=session_id, username=player_name).update(
-        is_ready=False
-    )
-
-
-async def is_ready_to_advance(session_id: str):
-    players = await Player.filter(session_id=session_id, is_connected=True)
-    return len(players) > 0 and all([player.is_ready for player in players])
-
-
-async def is_terminated(session_id: str):
-    session = await Session.get(id=session_id)
-    return session.is_terminated
+    await Player.filter(
+        session_id=session_id, username=player_name, is_connected=True
+    ).update(is_ready=False)
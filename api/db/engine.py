@@ -0,0 +1,107 @@
+import time
+from typing import Any
+import asyncpg
+from tortoise import connections
+from tortoise.backends.asyncpg.client import AsyncpgDBClient, TransactionWrapper
+from tortoise.backends.base.client import (
+    PoolConnectionWrapper,
+    TransactionContextPooled,
+)
+from tortoise.backends.base.config_generator import generate_config
+from config import (
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
+    DB_POOL_MAX_QUERIES,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_COMMAND_TIMEOUT,
+)
+from metrics import DB_POOL_ACQUIRE_LATENCY, DB_TRANSACTION_LATENCY
+
+"""
+A Tortoise engine for Postgres that is Tortoise's asyncpg engine, with its connection pool sized and tuned from config
+and instrumented: how long checking out a connection waits, how many connections are in use, idle or waited for,
+and how long transactions hold their connection for.
+Use it by initialising Tortoise with get_tortoise_config rather than with a bare DB URI.
+"""
+
+
+def get_tortoise_config(db_uri: str):
+    config = generate_config(db_uri, {"models": ["db.models"]})
+    default = config["connections"]["default"]
+    default["engine"] = __name__
+    default["credentials"].update(
+        minsize=DB_POOL_MIN_SIZE,
+        maxsize=DB_POOL_MAX_SIZE,
+        acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+        max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
+        max_queries=DB_POOL_MAX_QUERIES,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        command_timeout=DB_COMMAND_TIMEOUT,
+    )
+    return config
+
+
+class InstrumentedAsyncpgDBClient(AsyncpgDBClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the rest of the credentials are passed on to asyncpg.create_pool, which doesn't take this one
+        self.acquire_timeout = float(self.extra.pop("acquire_timeout", 10.0))
+        self.waiting = 0
+
+    def get_pool_stats(self):
+        if self._pool is None:
+            return {"active": 0, "idle": 0, "waiting": self.waiting}
+        idle = self._pool.get_idle_size()
+        return {
+            "active": self._pool.get_size() - idle,
+            "idle": idle,
+            "waiting": self.waiting,
+        }
+
+    async def acquire_from_pool(self) -> asyncpg.Connection:
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            return await self._pool.acquire(timeout=self.acquire_timeout)
+        finally:
+            self.waiting -= 1
+            DB_POOL_ACQUIRE_LATENCY.observe(time.perf_counter() - start)
+
+    def acquire_connection(self):
+        return InstrumentedPoolConnectionWrapper(self)
+
+    def _in_transaction(self):
+        return InstrumentedTransactionContext(TransactionWrapper(self))
+
+
+class InstrumentedPoolConnectionWrapper(PoolConnectionWrapper):
+    async def __aenter__(self):
+        await self.ensure_connection()
+        self.connection = await self.client.acquire_from_pool()
+        return self.connection
+
+
+class InstrumentedTransactionContext(TransactionContextPooled):
+    # the same as TransactionContextPooled, other than checking out the connection through the instrumented client
+    # and timing the transaction from then until the connection is released
+    async def __aenter__(self):
+        await self.ensure_connection()
+        self.token = connections.set(self.connection_name, self.connection)
+        self.connection._connection = await self.connection._parent.acquire_from_pool()
+        self.started_at = time.perf_counter()
+        await self.connection.start()
+        return self.connection
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        try:
+            await super().__aexit__(exc_type, exc_val, exc_tb)
+        finally:
+            outcome = "rollback" if exc_type else "commit"
+            DB_TRANSACTION_LATENCY.labels(outcome).observe(
+                time.perf_counter() - self.started_at
+            )
+
+
+client_class = InstrumentedAsyncpgDBClient
@@ -0,0 +1,78 @@
+import time
+import asyncpg
+from contextlib import suppress
+from itertools import islice
+from typing import Iterable, Type
+from uuid import uuid4
+from tortoise import models
+from config import INGESTION_BATCH_SIZE
+from metrics import DB_INGESTION_ROWS, DB_INGESTION_BATCH_LATENCY
+
+"""
+Streams rows into a table with COPY, in batches of INGESTION_BATCH_SIZE rows, instead of building a model instance
+per row and inserting them all at once with bulk_create. Rows are tuples of column values, taken lazily from the
+given iterable, so only a batch of them is held at a time however many there are.
+Each batch is copied into a temporary table, then inserted from there into the table, so that rows conflicting with
+existing ones are updated (or skipped when there are no columns to update) as with bulk_create's on_conflict.
+The temporary table is created once per call, under a name of its own, and dropped once all batches are in. Inside
+a caller's transaction batches only run in savepoints, so a table dropped on commit would outlive the call.
+"""
+
+
+def batched(rows: Iterable[tuple], batch_size: int):
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+async def copy_upsert(
+    model: Type[models.Model],
+    columns: list[str],
+    rows: Iterable[tuple],
+    conflict_columns: list[str],
+    update_columns: list[str] | None = None,
+    batch_size: int = INGESTION_BATCH_SIZE,
+):
+    table = model._meta.db_table
+    staging_table = f"_ingest_{table}_{uuid4().hex}"
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    conflict_list = ", ".join(f'"{column}"' for column in conflict_columns)
+    if update_columns:
+        updates = ", ".join(
+            f'"{column}" = EXCLUDED."{column}"' for column in update_columns
+        )
+        on_conflict = f"ON CONFLICT ({conflict_list}) DO UPDATE SET {updates}"
+    else:
+        on_conflict = f"ON CONFLICT ({conflict_list}) DO NOTHING"
+    # a conflict target can't be updated twice by the same insert, so a batch keeps one row per target
+    insert = f"""
+        INSERT INTO "{table}" ({column_list})
+        SELECT DISTINCT ON ({conflict_list}) {column_list} FROM "{staging_table}"
+        {on_conflict}
+    """
+
+    count = 0
+    # model._meta.db is the connection of the transaction the caller is in, if any
+    async with model._meta.db.acquire_connection() as conn:
+        await conn.execute(
+            f'CREATE TEMPORARY TABLE "{staging_table}" (LIKE "{table}" INCLUDING DEFAULTS)'
+        )
+        try:
+            for batch in batched(rows, batch_size):
+                start = time.perf_counter()
+                async with conn.transaction():
+                    await conn.copy_records_to_table(
+                        staging_table, records=batch, columns=columns
+                    )
+                    await conn.execute(insert)
+                    await conn.execute(f'TRUNCATE "{staging_table}"')
+                DB_INGESTION_BATCH_LATENCY.labels(table).observe(
+                    time.perf_counter() - start
+                )
+                DB_INGESTION_ROWS.labels(table).inc(len(batch))
+                count += len(batch)
+        finally:
+            # a failed caller's transaction can't run the drop, rolling it back drops the table instead
+            with suppress(asyncpg.PostgresError):
+                await conn.execute(f'DROP TABLE IF EXISTS "{staging_table}"')
+    return count
@@ -0,0 +1,57 @@
+import asyncpg
+
+"""
+The schema as generate_schemas first created it, so that an empty database can be migrated from scratch.
+"""
+
+
+async def upgrade(conn: asyncpg.Connection):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS "session" (
+            "id" VARCHAR(20) NOT NULL PRIMARY KEY,
+            "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            "version" INT NOT NULL DEFAULT 0,
+            "is_terminated" BOOL NOT NULL DEFAULT False
+        );
+        CREATE TABLE IF NOT EXISTS "player" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "username" VARCHAR(30) NOT NULL,
+            "is_connected" BOOL NOT NULL DEFAULT True,
+            "is_ready" BOOL NOT NULL DEFAULT False,
+            "session_id" VARCHAR(20) NOT NULL REFERENCES "session" ("id") ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS "repository" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "is_loaded" BOOL NOT NULL DEFAULT False,
+            "name" VARCHAR(100) NOT NULL,
+            "default_branch" VARCHAR(100) NOT NULL,
+            "last_pushed_at" TIMESTAMPTZ NOT NULL,
+            "author_id" UUID NOT NULL REFERENCES "player" ("id") ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS "file" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "path" VARCHAR(200) NOT NULL,
+            "download_url" VARCHAR(200) NOT NULL,
+            "visit_url" VARCHAR(200) NOT NULL,
+            "author_id" UUID NOT NULL REFERENCES "player" ("id") ON DELETE CASCADE,
+            "repo_id" UUID NOT NULL REFERENCES "repository" ("id") ON DELETE CASCADE,
+            "session_id" VARCHAR(20) NOT NULL REFERENCES "session" ("id") ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS "sourcecode" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "content" TEXT NOT NULL,
+            "file_id" UUID NOT NULL REFERENCES "file" ("id") ON DELETE CASCADE,
+            "session_id" VARCHAR(20) NOT NULL REFERENCES "session" ("id") ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS "comment" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "content" TEXT NOT NULL,
+            "type" VARCHAR(20) NOT NULL,
+            "line_start" INT NOT NULL,
+            "line_end" INT NOT NULL,
+            "author_id" UUID NOT NULL REFERENCES "player" ("id") ON DELETE CASCADE,
+            "source_code_id" UUID NOT NULL REFERENCES "sourcecode" ("id") ON DELETE CASCADE
+        );
+        """
+    )
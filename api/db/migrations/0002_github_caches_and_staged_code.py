@@ -0,0 +1,27 @@
+import asyncpg
+
+"""
+The cache of Github responses, the blob sha of files and the code staged for the next round.
+"""
+
+
+async def upgrade(conn: asyncpg.Connection):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS "githubresponse" (
+            "key" VARCHAR(500) NOT NULL PRIMARY KEY,
+            "etag" VARCHAR(200),
+            "last_modified" VARCHAR(100),
+            "link" TEXT,
+            "body" JSONB NOT NULL,
+            "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        ALTER TABLE "file" ADD COLUMN IF NOT EXISTS "sha" VARCHAR(40);
+        CREATE TABLE IF NOT EXISTS "stagedcode" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "content" TEXT NOT NULL,
+            "file_id" UUID NOT NULL REFERENCES "file" ("id") ON DELETE CASCADE,
+            "session_id" VARCHAR(20) NOT NULL UNIQUE REFERENCES "session" ("id") ON DELETE CASCADE
+        );
+        """
+    )
@@ -0,0 +1,60 @@
+import asyncpg
+from db.migrations import has_column
+
+"""
+Turns the repos and files that were loaded per session and player into a catalogue per Github user, which sessions
+draw files from into their pool.
+The per-session rows can't be merged into the catalogue, which Github fills up again as players join, so they're
+deleted along with the code (and its comments) of the rounds in progress. Players rejoining a session have their
+files loaded into its pool then.
+"""
+
+
+async def upgrade(conn: asyncpg.Connection):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS "author" (
+            "username" VARCHAR(39) NOT NULL PRIMARY KEY,
+            "repos_refreshed_at" TIMESTAMPTZ
+        );
+        """
+    )
+    if await has_column(conn, "file", "session_id"):
+        await conn.execute(
+            """
+            DELETE FROM "file";
+            DELETE FROM "repository";
+
+            ALTER TABLE "repository"
+                DROP COLUMN "is_loaded",
+                DROP CONSTRAINT IF EXISTS "repository_author_id_fkey",
+                ALTER COLUMN "author_id" TYPE VARCHAR(39) USING "author_id"::TEXT,
+                ADD CONSTRAINT "repository_author_id_fkey"
+                    FOREIGN KEY ("author_id") REFERENCES "author" ("username") ON DELETE CASCADE,
+                ADD COLUMN "files_refreshed_at" TIMESTAMPTZ,
+                ADD COLUMN "files_failed_at" TIMESTAMPTZ,
+                ADD CONSTRAINT "repository_name_key" UNIQUE ("name");
+
+            ALTER TABLE "file"
+                DROP COLUMN "session_id",
+                DROP CONSTRAINT IF EXISTS "file_author_id_fkey",
+                ALTER COLUMN "author_id" TYPE VARCHAR(39) USING "author_id"::TEXT,
+                ADD CONSTRAINT "file_author_id_fkey"
+                    FOREIGN KEY ("author_id") REFERENCES "author" ("username") ON DELETE CASCADE,
+                ADD COLUMN "is_playable" BOOL NOT NULL DEFAULT True,
+                ADD CONSTRAINT "uid_file_repo_id_5dbee5" UNIQUE ("repo_id", "path");
+            """
+        )
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS "poolfile" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "is_played" BOOL NOT NULL DEFAULT False,
+            "file_id" UUID NOT NULL REFERENCES "file" ("id") ON DELETE CASCADE,
+            "player_id" UUID NOT NULL REFERENCES "player" ("id") ON DELETE CASCADE,
+            "repo_id" UUID NOT NULL REFERENCES "repository" ("id") ON DELETE CASCADE,
+            "session_id" VARCHAR(20) NOT NULL REFERENCES "session" ("id") ON DELETE CASCADE,
+            CONSTRAINT "uid_poolfile_session_c6877f" UNIQUE ("session_id", "file_id")
+        );
+        """
+    )
@@ -0,0 +1,17 @@
+import asyncpg
+
+"""
+Loading a player's files after they joined, and the pool's play order.
+"""
+
+
+async def upgrade(conn: asyncpg.Connection):
+    await conn.execute(
+        """
+        ALTER TABLE "player" ADD COLUMN IF NOT EXISTS "is_loading_files" BOOL NOT NULL DEFAULT False;
+
+        ALTER TABLE "poolfile" ADD COLUMN IF NOT EXISTS "position" DOUBLE PRECISION NOT NULL DEFAULT 0;
+        CREATE INDEX IF NOT EXISTS "idx_poolfile_session_7c8b45"
+            ON "poolfile" ("session_id", "is_played", "position");
+        """
+    )
@@ -0,0 +1,24 @@
+import asyncpg
+
+"""
+Indexes for the lookups made on every join, advance and pick of the next file, which were sequential scans.
+Postgres doesn't index foreign key columns by itself, so looking up a session's code or a code's comments wasn't
+indexed either. The names are the ones generate_schemas gives the indexes declared on the models.
+"""
+
+
+async def upgrade(conn: asyncpg.Connection):
+    await conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS "idx_player_session_aa99c0"
+            ON "player" ("session_id", "username");
+        CREATE INDEX IF NOT EXISTS "idx_repository_author__584315"
+            ON "repository" ("author_id", "last_pushed_at");
+        CREATE INDEX IF NOT EXISTS "idx_poolfile_session_2700e4"
+            ON "poolfile" ("session_id", "player_id", "position");
+        CREATE INDEX IF NOT EXISTS "idx_sourcecode_session_74e46f"
+            ON "sourcecode" ("session_id");
+        CREATE INDEX IF NOT EXISTS "idx_comment_source__383423"
+            ON "comment" ("source_code_id");
+        """
+    )
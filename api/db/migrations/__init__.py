@@ -0,0 +1,95 @@
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+from types import ModuleType
+import asyncpg
+
+LOGGER = logging.getLogger(__name__)
+
+"""
+Versioned migrations of the DB schema. Tortoise.generate_schemas(safe=True) only creates the tables that don't
+exist yet, so columns, constraints and indexes added to the models later never reach an existing database.
+Each module of this package named <version>_<name>.py is a migration with an `upgrade(conn)` coroutine. They're
+applied in the order of version, each in its own transaction along with its row in schema_migrations, and the
+versions found there are skipped. Run them with python cli.py migrate.
+
+Migrations are written to be no-ops against a schema that is already up to date, as a database created by
+generate_schemas is, so that they can be applied to any database whatever created it.
+"""
+
+# taken for the duration of a migration run, so that concurrent runs (i.e. deploys) apply each migration once
+ADVISORY_LOCK_KEY = 7411
+
+
+@dataclass
+class Migration:
+    version: str
+    name: str
+    module: ModuleType
+
+
+def get_migrations():
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        version, _, name = module_info.name.partition("_")
+        if not version.isdigit():
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(Migration(version=version, name=name, module=module))
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+async def get_applied_versions(conn: asyncpg.Connection):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS "schema_migrations" (
+            "version" VARCHAR(20) NOT NULL PRIMARY KEY,
+            "name" VARCHAR(100) NOT NULL,
+            "applied_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    rows = await conn.fetch('SELECT "version" FROM "schema_migrations"')
+    return {row["version"] for row in rows}
+
+
+async def get_pending_migrations(conn: asyncpg.Connection):
+    applied_versions = await get_applied_versions(conn)
+    return [
+        migration
+        for migration in get_migrations()
+        if migration.version not in applied_versions
+    ]
+
+
+async def migrate(conn: asyncpg.Connection):
+    await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_KEY)
+    try:
+        applied = []
+        for migration in await get_pending_migrations(conn):
+            LOGGER.info(f"Applying migration {migration.version} {migration.name}")
+            async with conn.transaction():
+                await migration.module.upgrade(conn)
+                await conn.execute(
+                    'INSERT INTO "schema_migrations" ("version", "name") VALUES ($1, $2)',
+                    migration.version,
+                    migration.name,
+                )
+            applied.append(migration)
+        return applied
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+
+
+async def has_column(conn: asyncpg.Connection, table: str, column: str):
+    return await conn.fetchval(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = $1 AND column_name = $2
+        )
+        """,
+        table,
+        column,
+    )
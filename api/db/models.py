@@ -16,27 +16,60 @@ class Player(models.Model):
     username = fields.CharField(max_length=30)
     is_connected = fields.BooleanField(default=True)
     is_ready = fields.BooleanField(default=False)
+    # set while the player's files are loaded into the pool, after they joined
+    is_loading_files = fields.BooleanField(default=False)
     session: fields.ForeignKeyRelation[Session] = fields.ForeignKeyField(
         "models.Session", "players"
     )
-    repos: fields.ReverseRelation["Repository"]
+    pool: fields.ReverseRelation["PoolFile"]
+
+    class Meta:
+        indexes = (("session", "username"),)
 
     @property
     def profile_url(self):
         return f"https://avatars.githubusercontent.com/{self.username}"
 
 
+"""
+Authors, their repositories and their files make up a catalogue of Github users that outlives sessions,
+so that a user joining another session doesn't list and insert their repos and files all over again.
+Sessions draw files from the catalogue into their pool by reference (PoolFile).
+"""
+
+
+class Author(models.Model):
+    username = fields.CharField(max_length=39, pk=True)
+    # when the author's repos were last listed, None if they never were
+    repos_refreshed_at = fields.DatetimeField(null=True)
+    repos: fields.ReverseRelation["Repository"]
+
+
 class Repository(models.Model):
     id = fields.UUIDField(pk=True)
-    is_loaded = fields.BooleanField(default=False)
-    name = fields.CharField(max_length=100)
+    name = fields.CharField(max_length=100, unique=True)
     default_branch = fields.CharField(max_length=100)
     last_pushed_at = fields.DatetimeField()
+    # when the repo's files were last listed, they are stale once the repo was pushed to since
+    files_refreshed_at = fields.DatetimeField(null=True)
+    # when listing the repo's files last failed, None once they were listed since
+    files_failed_at = fields.DatetimeField(null=True)
 
-    author: fields.ForeignKeyRelation[Player] = fields.ForeignKeyField(
-        "models.Player", "repos"
+    author: fields.ForeignKeyRelation[Author] = fields.ForeignKeyField(
+        "models.Author", "repos"
     )
 
+    class Meta:
+        # a player's repos are drawn into the pool by least recently pushed first
+        indexes = (("author", "last_pushed_at"),)
+
+    @property
+    def are_files_fresh(self):
+        return (
+            self.files_refreshed_at is not None
+            and self.files_refreshed_at >= self.last_pushed_at
+        )
+
 
 class File(models.Model):
     id = fields.UUIDField(pk=True)
@@ -44,18 +77,21 @@ class File(models.Model):
     path = fields.CharField(max_length=200)
     download_url = fields.CharField(max_length=200)
     visit_url = fields.CharField(max_length=200)
+    # the git blob sha of the file's content, rows created before it was tracked don't have one
+    sha = fields.CharField(max_length=40, null=True)
+    # unset once the file turned out to be unsupported or gone when downloaded, until its repo is listed again
+    is_playable = fields.BooleanField(default=True)
 
     repo: fields.ForeignKeyRelation[Repository] = fields.ForeignKeyField(
         "models.Repository", "files"
     )
 
-    author: fields.ForeignKeyRelation[Player] = fields.ForeignKeyField(
-        "models.Player", "files"
+    author: fields.ForeignKeyRelation[Author] = fields.ForeignKeyField(
+        "models.Author", "files"
     )
 
-    session: fields.ForeignKeyRelation[Session] = fields.ForeignKeyField(
-        "models.Session", "files"
-    )
+    class Meta:
+        unique_together = (("repo", "path"),)
 
     @property
     def name(self):
@@ -66,6 +102,36 @@ class File(models.Model):
         return Path(self.path).suffix[1:]
 
 
+class PoolFile(models.Model):
+    id = fields.UUIDField(pk=True)
+    # files are played rather than removed from the pool, so that the repos a player contributed stay known
+    is_played = fields.BooleanField(default=False)
+    # the pool is played in the order of position, an integral slot per player's file plus a random tie-breaker
+    position = fields.FloatField(default=0)
+
+    session: fields.ForeignKeyRelation[Session] = fields.ForeignKeyField(
+        "models.Session", "pool"
+    )
+    # the player of the session who authored the file
+    player: fields.ForeignKeyRelation[Player] = fields.ForeignKeyField(
+        "models.Player", "pool"
+    )
+    repo: fields.ForeignKeyRelation[Repository] = fields.ForeignKeyField(
+        "models.Repository", "pool"
+    )
+    file: fields.ForeignKeyRelation[File] = fields.ForeignKeyField(
+        "models.File", "pool"
+    )
+
+    class Meta:
+        unique_together = (("session", "file"),)
+        # the next file is picked in the order of position, and a player's next slot is after their last file
+        indexes = (
+            ("session", "is_played", "position"),
+            ("session", "player", "position"),
+        )
+
+
 class SourceCode(models.Model):
     id = fields.UUIDField(pk=True)
     content = fields.TextField()
@@ -80,6 +146,22 @@ class SourceCode(models.Model):
 
     comments: fields.ReverseRelation["Comment"]
 
+    class Meta:
+        indexes = (("session",),)
+
+
+class StagedCode(models.Model):
+    id = fields.UUIDField(pk=True)
+    content = fields.TextField()
+
+    file: fields.ForeignKeyRelation[File] = fields.ForeignKeyField(
+        "models.File", "staged_code"
+    )
+
+    session: fields.OneToOneRelation[Session] = fields.OneToOneField(
+        "models.Session", "staged_code"
+    )
+
 
 class Comment(models.Model):
     class Type(str, Enum):
@@ -99,3 +181,15 @@ class Comment(models.Model):
     source_code: fields.ForeignKeyRelation[SourceCode] = fields.ForeignKeyField(
         "models.SourceCode", "comments"
     )
+
+    class Meta:
+        indexes = (("source_code",),)
+
+
+class GithubResponse(models.Model):
+    key = fields.CharField(max_length=500, pk=True)
+    etag = fields.CharField(max_length=200, null=True)
+    last_modified = fields.CharField(max_length=100, null=True)
+    link = fields.TextField(null=True)
+    body = fields.JSONField()
+    updated_at = fields.DatetimeField(auto_now=True)
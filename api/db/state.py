@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from uuid import UUID, uuid4
+from tortoise.exceptions import DoesNotExist, IntegrityError
+from tortoise.transactions import in_transaction
+import db.crud as Crud
+import db.models as Models
+import db.views as Views
+from metrics import SESSION_SNAPSHOT_REQUESTS
+
+LOGGER = logging.getLogger(__name__)
+
+"""
+Holds the state of active sessions in memory: players, readiness, the current code and its comments.
+WS events read it instead of rebuilding it from Postgres, and the frequent mutations (readying up, waiting and
+commenting) are applied to it right away, then written behind to Postgres in batches.
+The rarer mutations (joining, leaving and advancing) still go through Crud, after flushing whatever is pending,
+and the state is updated from their outcome.
+The lobby, code and comments messages built from it are kept as snapshots, which are only rebuilt once the part of
+the state they were built from changed since.
+
+A session's state is loaded from Postgres when it is first touched, and evicted once idle.
+Like ConnectionManager, this assumes all of a session's WS connections are served by the same process.
+"""
+
+
+@dataclass
+class PlayerState:
+    id: UUID
+    username: str
+    profile_url: str
+    is_connected: bool
+    is_ready: bool
+    is_loading_files: bool
+
+
+@dataclass
+class SessionState:
+    id: str
+    is_terminated: bool
+    players: dict[str, PlayerState]
+    code: Views.Code | None
+    comments: list[Views.Comment]
+    touched_at: float = field(default_factory=time.monotonic)
+    # the latest readiness of players and the comments not yet written to Postgres
+    pending_readiness: dict[str, bool] = field(default_factory=dict)
+    pending_comments: list[Models.Comment] = field(default_factory=list)
+    flush_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # bumped whenever the players, the code or its comments change, snapshots built from them are kept until then
+    lobby_version: int = 0
+    code_version: int = 0
+    comments_version: int = 0
+    snapshots: dict[str, tuple[int, Any]] = field(default_factory=dict)
+    # the sequence number of the last message broadcast to the session. It starts from the time the state was
+    # loaded, so that it keeps increasing for clients that were connected before the state was evicted and reloaded
+    seq: int = field(default_factory=lambda: time.time_ns() // 1_000_000)
+
+    @property
+    def has_pending_writes(self):
+        return len(self.pending_readiness) > 0 or len(self.pending_comments) > 0
+
+    @property
+    def is_ready_to_advance(self):
+        players = [player for player in self.players.values() if player.is_connected]
+        # advancing before someone's files are loaded could find the pool empty and finish the game
+        return len(players) > 0 and all(
+            [player.is_ready and not player.is_loading_files for player in players]
+        )
+
+    def get_snapshot(self, name: str, version: int, build: Callable[[], Any]):
+        snapshot = self.snapshots.get(name)
+        if snapshot is not None and snapshot[0] == version:
+            SESSION_SNAPSHOT_REQUESTS.labels(name, "hit").inc()
+            return snapshot[1]
+        SESSION_SNAPSHOT_REQUESTS.labels(name, "miss").inc()
+        value = build()
+        self.snapshots[name] = (version, value)
+        return value
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def get_player(self, player_name: str):
+        player = self.players[player_name]
+        return Views.Player(
+            profile_url=player.profile_url,
+            username=player.username,
+            is_connected=player.is_connected,
+            is_ready=player.is_ready,
+        )
+
+    def get_players(self):
+        return [self.get_player(player_name) for player_name in self.players]
+
+
+async def load_players(session_id: str):
+    db_players = await Models.Player.filter(session_id=session_id)
+    return {
+        db_player.username: PlayerState(
+            id=db_player.id,
+            username=db_player.username,
+            profile_url=db_player.profile_url,
+            is_connected=db_player.is_connected,
+            is_ready=db_player.is_ready,
+            is_loading_files=db_player.is_loading_files,
+        )
+        for db_player in db_players
+    }
+
+
+async def load_code(session_id: str):
+    try:
+        return await Views.get_code(session_id)
+    except DoesNotExist:
+        return None
+
+
+async def load_comments(session_id: str):
+    return await Views.get_comments(session_id)
+
+
+class SessionStateStore:
+    def __init__(self, flush_interval: float, idle_timeout: float):
+        self.__flush_interval = flush_interval
+        self.__idle_timeout = idle_timeout
+        self.__states: dict[str, SessionState] = {}
+        self.__load_locks: dict[str, asyncio.Lock] = {}
+        self.__flusher: asyncio.Task | None = None
+
+    async def get(self, session_id: str) -> SessionState:
+        state = self.__states.get(session_id)
+        if state is None:
+            lock = self.__load_locks.setdefault(session_id, asyncio.Lock())
+            async with lock:
+                state = self.__states.get(session_id)
+                if state is None:
+                    state = await self.__load(session_id)
+                    self.__states[session_id] = state
+        state.touched_at = time.monotonic()
+        return state
+
+    async def __load(self, session_id: str):
+        session = await Models.Session.get(id=session_id)
+        return SessionState(
+            id=session_id,
+            is_terminated=session.is_terminated,
+            players=await load_players(session_id),
+            code=await load_code(session_id),
+            comments=await load_comments(session_id),
+        )
+
+    def ready_up(self, state: SessionState, player_name: str):
+        self.__set_readiness(state, player_name, True)
+
+    def wait(self, state: SessionState, player_name: str):
+        self.__set_readiness(state, player_name, False)
+
+    def __set_readiness(self, state: SessionState, player_name: str, is_ready: bool):
+        player = state.players.get(player_name)
+        if player is None or not player.is_connected or player.is_ready == is_ready:
+            return
+        player.is_ready = is_ready
+        state.pending_readiness[player_name] = is_ready
+        state.lobby_version += 1
+
+    def add_comment(
+        self,
+        state: SessionState,
+        content: str,
+        line_start: int,
+        line_end: int,
+        type: Models.Comment.Type,
+        author_name: str,
+    ):
+        if state.code is None:
+            raise Crud.NoSelectedCodeError()
+        author = state.players[author_name]
+        comment = Views.Comment(
+            id=str(uuid4()),
+            content=content,
+            line_start=line_start,
+            line_end=line_end,
+            type=type,
+            author=Views.CommentAuthor(
+                username=author.username, profile_url=author.profile_url
+            ),
+        )
+        state.comments.append(comment)
+        state.comments_version += 1
+        state.pending_comments.append(
+            Models.Comment(
+                id=UUID(comment.id),
+                content=content,
+                line_start=line_start,
+                line_end=line_end,
+                type=type,
+                author_id=author.id,
+                source_code_id=UUID(state.code.id),
+            )
+        )
+        return comment
+
+    async def on_joined(self, state: SessionState):
+        players = await load_players(state.id)
+        # readiness that came in while the players were reloaded hasn't been written yet
+        for player_name, is_ready in state.pending_readiness.items():
+            if player_name in players:
+                players[player_name].is_ready = is_ready
+        state.players = players
+        state.lobby_version += 1
+
+    def on_left(self, state: SessionState, player_name: str):
+        player = state.players.get(player_name)
+        if player is not None:
+            player.is_connected = False
+            player.is_ready = False
+            player.is_loading_files = False
+        state.pending_readiness.pop(player_name, None)
+        state.lobby_version += 1
+
+    def on_files_loaded(self, state: SessionState, player_name: str):
+        player = state.players.get(player_name)
+        if player is not None:
+            player.is_loading_files = False
+
+    async def on_advanced(self, state: SessionState, session: Models.Session):
+        # Crud.advance unreadied everyone, and readiness (or comments) that came in meanwhile was for the last round
+        for player in state.players.values():
+            player.is_ready = False
+        state.pending_readiness.clear()
+        state.pending_comments.clear()
+        state.comments = []
+        state.is_terminated = session.is_terminated
+        state.code = None if session.is_terminated else await load_code(state.id)
+        state.lobby_version += 1
+        state.code_version += 1
+        state.comments_version += 1
+
+    async def flush(self, session_id: str):
+        # writes the session's pending mutations, which Crud's own mutations of the session must come after
+        state = self.__states.get(session_id)
+        if state is None:
+            return
+        async with state.flush_lock:
+            if not state.has_pending_writes:
+                return
+            readiness, state.pending_readiness = state.pending_readiness, {}
+            comments, state.pending_comments = state.pending_comments, []
+            # Readiness and comments are written apart, so that either failing doesn't hold the other back. Clients
+            # were already sent these mutations, so those that failed are put back to be written by the next flush,
+            # behind any that came in since. Readiness that changed since supersedes the unwritten one.
+            if len(readiness) > 0:
+                try:
+                    await self.__write_readiness(session_id, readiness)
+                except Exception as e:
+                    LOGGER.exception(e)
+                    LOGGER.error(
+                        f"Failed to write {len(readiness)} readiness changes of {session_id}, "
+                        "retrying on the next flush"
+                    )
+                    for player_name, is_ready in readiness.items():
+                        state.pending_readiness.setdefault(player_name, is_ready)
+            if len(comments) > 0:
+                unwritten_comments = await self.__write_comments(session_id, comments)
+                state.pending_comments = unwritten_comments + state.pending_comments
+
+    async def __write_readiness(self, session_id: str, readiness: dict[str, bool]):
+        async with in_transaction():
+            for player_name, is_ready in readiness.items():
+                if is_ready:
+                    await Crud.ready_up(session_id, player_name)
+                else:
+                    await Crud.wait(session_id, player_name)
+
+    async def __write_comments(self, session_id: str, comments: list[Models.Comment]):
+        # returns the comments to retry
+        try:
+            await Models.Comment.bulk_create(comments)
+            return []
+        except IntegrityError:
+            pass
+        except Exception as e:
+            LOGGER.exception(e)
+            LOGGER.error(
+                f"Failed to write {len(comments)} comments of {session_id}, retrying on the next flush"
+            )
+            return comments
+        # A comment breaking a constraint, i.e. on code deleted meanwhile, never gets written, so the comments are
+        # written one by one and those are dropped. A comment whose id is taken was written by an earlier attempt.
+        for index, comment in enumerate(comments):
+            try:
+                await comment.save(force_create=True)
+            except IntegrityError as e:
+                LOGGER.error(f"Dropping comment {comment.id} of {session_id}: {e}")
+            except Exception as e:
+                LOGGER.exception(e)
+                return comments[index:]
+        return []
+
+    def start(self):
+        if self.__flusher is None:
+            self.__flusher = asyncio.create_task(self.__flush_periodically())
+
+    async def __flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.__flush_interval)
+            try:
+                await self.__flush_and_evict()
+            except Exception as e:
+                LOGGER.exception(e)
+
+    async def __flush_and_evict(self):
+        now = time.monotonic()
+        for session_id, state in list(self.__states.items()):
+            await self.flush(session_id)
+            is_idle = now - state.touched_at > self.__idle_timeout
+            if is_idle and not state.has_pending_writes:
+                del self.__states[session_id]
+                self.__load_locks.pop(session_id, None)
+
+    async def close(self):
+        if self.__flusher is not None:
+            self.__flusher.cancel()
+            await asyncio.gather(self.__flusher, return_exceptions=True)
+            self.__flusher = None
+        for session_id, state in list(self.__states.items()):
+            await self.flush(session_id)
+            if state.has_pending_writes:
+                LOGGER.error(
+                    f"Dropping {len(state.pending_readiness)} readiness changes and "
+                    f"{len(state.pending_comments)} comments of {session_id} that failed to be written"
+                )
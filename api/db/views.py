@@ -1,6 +1,5 @@
 from pathlib import PurePosixPath
 from pydantic import BaseModel
-from uuid import UUID
 import db.models as Models
 
 
@@ -35,72 +34,42 @@ class Comment(BaseModel):
     author: CommentAuthor
 
 
-async def get_players(session_id: str):
-    db_players = await Models.Player.filter(session_id=session_id).all()
-    return [
-        Player(
-            profile_url=db_player.profile_url,
-            username=db_player.username,
-            is_connected=db_player.is_connected,
-            is_ready=db_player.is_ready,
-        )
-        for db_player in db_players
-    ]
-
-
 async def get_code(session_id: str):
-    source_code = await Models.SourceCode.get(session_id=session_id)
-    file = await Models.File.get(id=source_code.file_id)
-    repo = await Models.Repository.get(id=file.repo_id)
-    author = await Models.Player.get(id=file.author_id)
+    # the code, its file and the file's repo come from a single joined query
+    source_code = (
+        await Models.SourceCode.filter(session_id=session_id)
+        .select_related("file__repo")
+        .get()
+    )
+    file = source_code.file
     return Code(
         id=str(source_code.id),
         content=source_code.content,
-        author=author.username,
+        author=file.author_id,
         file_name=file.name,
         file_extension=file.extension,
         file_visit_url=file.visit_url,
-        file_display_path=str(PurePosixPath(repo.name, "...", file.name)),
+        file_display_path=str(PurePosixPath(file.repo.name, "...", file.name)),
     )
 
 
-async def get_comment(comment_id: str):
-    db_comment = await Models.Comment.get(id=UUID(comment_id))
-    author = await Models.Player.get(id=db_comment.author_id)
+def to_comment(db_comment: Models.Comment):
     return Comment(
         id=str(db_comment.id),
         content=db_comment.content,
         line_start=db_comment.line_start,
         line_end=db_comment.line_end,
         type=db_comment.type,
-        author=CommentAuthor(username=author.username, profile_url=author.profile_url),
+        author=CommentAuthor(
+            username=db_comment.author.username,
+            profile_url=db_comment.author.profile_url,
+        ),
     )
 
 
 async def get_comments(session_id: str) -> list[Comment]:
-    author_cache = {}
-
-    async def get_comment_author(author_id: UUID):
-        if author_id in author_cache:
-            return author_cache[author_id]
-        author = await Models.Player.get(id=author_id)
-        author_cache[author_id] = CommentAuthor(
-            username=author.username, profile_url=author.profile_url
-        )
-        return author_cache[author_id]
-
-    comments = []
-    source_code = await Models.SourceCode.get(session_id=session_id)
-    for db_comment in await source_code.comments.all():
-        author = await get_comment_author(db_comment.author_id)
-        comments.append(
-            Comment(
-                id=str(db_comment.id),
-                content=db_comment.content,
-                line_start=db_comment.line_start,
-                line_end=db_comment.line_end,
-                type=db_comment.type,
-                author=author,
-            )
-        )
-    return comments
+    # the comments on the session's code along with their authors, in a single joined query
+    db_comments = await Models.Comment.filter(
+        source_code__session_id=session_id
+    ).select_related("author")
+    return [to_comment(db_comment) for db_comment in db_comments]
@@ -1,13 +1,47 @@
-from config import GITHUB_ACCESS_TOKEN, GITHUB_CLIENT_ID, GITHUB_CLIENT_SECRET
+from config import (
+    GITHUB_ACCESS_TOKEN,
+    GITHUB_CLIENT_ID,
+    GITHUB_CLIENT_SECRET,
+    GITHUB_POOL_MAX_CONNECTIONS,
+    GITHUB_POOL_MAX_KEEPALIVE_CONNECTIONS,
+    GITHUB_POOL_KEEPALIVE_EXPIRY,
+    GITHUB_POOL_CONNECT_TIMEOUT,
+    GITHUB_POOL_READ_TIMEOUT,
+    GITHUB_POOL_ACQUIRE_TIMEOUT,
+    GITHUB_POOL_HTTP2,
+    GITHUB_RESPONSE_CACHE_MAX_ENTRIES,
+    GITHUB_RESPONSE_CACHE_MAX_BYTES,
+    GITHUB_RESPONSE_CACHE_MAX_AGE,
+    GITHUB_RESPONSE_CACHE_BACKEND,
+    GITHUB_BLOB_CACHE_MEMORY_BYTES,
+    GITHUB_BLOB_CACHE_DIR,
+    GITHUB_BLOB_CACHE_DISK_BYTES,
+    GITHUB_SCHEDULER_INTERACTIVE_RESERVE,
+    GITHUB_SCHEDULER_BACKGROUND_RESERVE,
+    GITHUB_SCHEDULER_MAX_WAIT,
+    SESSION_STATE_FLUSH_INTERVAL,
+    SESSION_STATE_IDLE_TIMEOUT,
+)
+from db import Caches, State
 from fastapi import Cookie, HTTPException, status, WebSocket, Depends
 from functools import cache
 from services import (
     Auth,
+    BackgroundTasks,
+    BlobCache,
     Context,
     Connection,
     ConnectionManager,
+    DiskBlobStore,
     GithubClient,
+    GithubConnectionPool,
     GithubOauth,
+    GithubRequestScheduler,
+    MemoryBlobStore,
+    MemoryResponseCache,
+    Priority,
+    SingleFlight,
+    TieredResponseCache,
 )
 
 
@@ -26,13 +60,72 @@ async def get_context(token: str | None = Cookie(default=None)):
         )
 
 
+@cache
+def get_gh_pool():
+    return GithubConnectionPool(
+        max_connections=GITHUB_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=GITHUB_POOL_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=GITHUB_POOL_KEEPALIVE_EXPIRY,
+        connect_timeout=GITHUB_POOL_CONNECT_TIMEOUT,
+        read_timeout=GITHUB_POOL_READ_TIMEOUT,
+        acquire_timeout=GITHUB_POOL_ACQUIRE_TIMEOUT,
+        http2=GITHUB_POOL_HTTP2,
+    )
+
+
+@cache
+def get_gh_response_cache():
+    memory_cache = MemoryResponseCache(
+        GITHUB_RESPONSE_CACHE_MAX_ENTRIES, GITHUB_RESPONSE_CACHE_MAX_BYTES
+    )
+    if GITHUB_RESPONSE_CACHE_BACKEND == "postgres":
+        return TieredResponseCache(
+            memory_cache,
+            Caches.PostgresResponseCache(GITHUB_RESPONSE_CACHE_MAX_AGE),
+        )
+    return memory_cache
+
+
+@cache
+def get_gh_blob_cache():
+    disk_store = None
+    if GITHUB_BLOB_CACHE_DIR is not None:
+        disk_store = DiskBlobStore(GITHUB_BLOB_CACHE_DIR, GITHUB_BLOB_CACHE_DISK_BYTES)
+    return BlobCache(MemoryBlobStore(GITHUB_BLOB_CACHE_MEMORY_BYTES), disk_store)
+
+
+@cache
+def get_gh_scheduler():
+    return GithubRequestScheduler(
+        reserves={
+            Priority.CRITICAL: 0,
+            Priority.INTERACTIVE: GITHUB_SCHEDULER_INTERACTIVE_RESERVE,
+            Priority.BACKGROUND: GITHUB_SCHEDULER_BACKGROUND_RESERVE,
+        },
+        max_wait=GITHUB_SCHEDULER_MAX_WAIT,
+    )
+
+
+@cache
+def get_gh_single_flight():
+    return SingleFlight()
+
+
+@cache
 def get_gh_client():
-    return GithubClient(GITHUB_ACCESS_TOKEN)
+    return GithubClient(
+        GITHUB_ACCESS_TOKEN,
+        get_gh_pool().client,
+        get_gh_response_cache(),
+        get_gh_blob_cache(),
+        get_gh_scheduler(),
+        get_gh_single_flight(),
+    )
 
 
 @cache
 def get_gh_oauth():
-    return GithubOauth(GITHUB_CLIENT_ID, GITHUB_CLIENT_SECRET)
+    return GithubOauth(GITHUB_CLIENT_ID, GITHUB_CLIENT_SECRET, get_gh_pool().client)
 
 
 def get_connection(
@@ -44,3 +137,15 @@ def get_connection(
 @cache
 def get_connection_manager():
     return ConnectionManager()
+
+
+@cache
+def get_background_tasks():
+    return BackgroundTasks()
+
+
+@cache
+def get_session_states():
+    return State.SessionStateStore(
+        SESSION_STATE_FLUSH_INTERVAL, SESSION_STATE_IDLE_TIMEOUT
+    )
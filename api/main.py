@@ -2,14 +2,27 @@ import logging
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from tortoise import Tortoise
-from config import DB_URI
+from config import (
+    DB_URI,
+    GITHUB_BLOB_CACHE_DIR,
+    GITHUB_TARBALL_INGESTION,
+    WS_PER_MESSAGE_DEFLATE,
+)
 from routes import socket_app, session, auth, user, misc
-from metrics import attach_instrumentation
+from db.engine import get_tortoise_config
+from metrics import (
+    attach_instrumentation,
+    attach_gh_pool_instrumentation,
+    attach_db_pool_instrumentation,
+)
+from deps import get_gh_pool, get_background_tasks, get_session_states
 
 logger = logging.getLogger()
 
-app = FastAPI()
+# responses are encoded with orjson, as WS messages are
+app = FastAPI(default_response_class=ORJSONResponse)
 app.include_router(auth.router)
 app.include_router(session.router)
 app.include_router(user.router)
@@ -28,16 +41,39 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def init_db_tables():
-    await Tortoise.init(db_url=DB_URI, modules={"models": ["db.models"]})
+    await Tortoise.init(config=get_tortoise_config(DB_URI))
     await Tortoise.generate_schemas(safe=True)
     logger.info("DB tables are ready to go!")
+    attach_db_pool_instrumentation(Tortoise.get_connection("default"))
     attach_instrumentation(app)
     logger.info("Instrumentation is ready to go!")
 
 
+@app.on_event("startup")
+async def init_gh_pool():
+    attach_gh_pool_instrumentation(get_gh_pool())
+    logger.info("Github connection pool is ready to go!")
+    if GITHUB_TARBALL_INGESTION and GITHUB_BLOB_CACHE_DIR is None:
+        logger.warning(
+            "GITHUB_TARBALL_INGESTION is on without a GITHUB_BLOB_CACHE_DIR, so the files of downloaded tarballs "
+            "aren't cached and are downloaded again when they are shown"
+        )
+
+
+@app.on_event("startup")
+async def init_session_states():
+    get_session_states().start()
+    logger.info("Session states are ready to go!")
+
+
 @app.on_event("shutdown")
-async def close_db_connections():
+async def shutdown():
+    # In order: background tasks (staging code, loading files) still write to the DB and call Github, then the
+    # pending session state is written while the DB is still connected, and Github goes last.
+    await get_background_tasks().close()
+    await get_session_states().close()
     await Tortoise.close_connections()
+    await get_gh_pool().close()
 
 
 @app.get("/hello")
@@ -47,4 +83,9 @@ def greeting():
 
 app.mount("/socket", socket_app)
 if __name__ == "__main__":
-    uvicorn.run(app, port=8001, log_config="./log.ini")
+    uvicorn.run(
+        app,
+        port=8001,
+        log_config="./log.ini",
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
+    )
@@ -2,9 +2,13 @@ from prometheus_client import Histogram, Counter, Gauge
 from prometheus_fastapi_instrumentator import Instrumentator
 from fastapi import FastAPI
 from functools import wraps
-from typing import Callable, TypeVar, ParamSpec
+from typing import Callable, TypeVar, ParamSpec, TYPE_CHECKING
 import inspect
 
+if TYPE_CHECKING:
+    from services.github.pool import GithubConnectionPool
+    from db.engine import InstrumentedAsyncpgDBClient
+
 NAMESPACE = "gitgame"
 SERVICE = "api"
 
@@ -36,6 +40,117 @@ WS_CONNECTIONS = Gauge(
     namespace=NAMESPACE,
     subsystem=SERVICE,
 )
+WS_SENT_BYTES = Counter(
+    "ws_sent_bytes",
+    "Bytes of Websocket messages sent, before any permessage-deflate compression, by encoding",
+    ["encoding"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+GITHUB_POOL_CONNECTIONS = Gauge(
+    "github_pool_connections",
+    "Github connection pool connections by state (active, idle, waiting)",
+    ["state"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+GITHUB_RESPONSE_CACHE_REQUESTS = Counter(
+    "github_response_cache_requests",
+    "Github API requests made with the response cache, by result (hit is a 304)",
+    ["result"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+GITHUB_BLOB_CACHE_REQUESTS = Counter(
+    "github_blob_cache_requests",
+    "Source file blob cache lookups, by the tier that served them (memory, disk or miss)",
+    ["tier"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    "github_rate_limit_remaining",
+    "Remaining Github API quota in the current rate limit window",
+    ["resource"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+GITHUB_SCHEDULER_QUEUE_DEPTH = Gauge(
+    "github_scheduler_queue_depth",
+    "Github requests waiting to be admitted by the request scheduler",
+    ["priority"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+GITHUB_SINGLE_FLIGHT_REQUESTS = Counter(
+    "github_single_flight_requests",
+    "Github calls made through single-flight, by result (hit is a call coalesced into an identical in-flight one)",
+    ["result"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+GITHUB_UNSUPPORTED_DOWNLOADS = Counter(
+    "github_unsupported_downloads",
+    "File downloads aborted because the file turned out to be unsupported, by reason",
+    ["reason"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+SESSION_SNAPSHOT_REQUESTS = Counter(
+    "session_snapshot_requests",
+    "Lobby, code and comments messages requested from session state, by message and result (miss is a rebuild)",
+    ["name", "result"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+DB_INGESTION_ROWS = Counter(
+    "db_ingestion_rows",
+    "Rows written to the DB by COPY-based ingestion, by table",
+    ["table"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+# ingestion throughput is the rate of db_ingestion_rows over the rate of this histogram's sum
+DB_INGESTION_BATCH_LATENCY = Histogram(
+    "db_ingestion_batch_latency_seconds",
+    "Time taken to copy and upsert a batch of ingested rows, by table",
+    ["table"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Postgres connection pool connections by state (active, idle, waiting)",
+    ["state"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+DB_POOL_ACQUIRE_LATENCY = Histogram(
+    "db_pool_acquire_latency_seconds",
+    "Time spent waiting to check out a connection from the Postgres connection pool",
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
+
+DB_TRANSACTION_LATENCY = Histogram(
+    "db_transaction_latency_seconds",
+    "Time a transaction held its connection for, by outcome (commit or rollback)",
+    ["outcome"],
+    namespace=NAMESPACE,
+    subsystem=SERVICE,
+)
 
 
 P = ParamSpec("P")
@@ -76,3 +191,17 @@ def attach_instrumentation(app: FastAPI):
     Instrumentator(excluded_handlers=[], should_group_status_codes=False).instrument(
         app, metric_namespace=NAMESPACE, metric_subsystem=SERVICE
     ).expose(app)
+
+
+def attach_gh_pool_instrumentation(pool: "GithubConnectionPool"):
+    for state in ["active", "idle", "waiting"]:
+        GITHUB_POOL_CONNECTIONS.labels(state).set_function(
+            lambda state=state: pool.get_stats()[state]
+        )
+
+
+def attach_db_pool_instrumentation(client: "InstrumentedAsyncpgDBClient"):
+    for state in ["active", "idle", "waiting"]:
+        DB_POOL_CONNECTIONS.labels(state).set_function(
+            lambda state=state: client.get_pool_stats()[state]
+        )
@@ -3,12 +3,13 @@ from enum import Enum
 from fastapi import APIRouter, status, Depends
 from fastapi.responses import RedirectResponse
 from urllib.parse import urlencode, urlparse
-from deps import get_gh_oauth
+from deps import get_gh_oauth, get_gh_pool
 from config import (
     CLIENT_URL,
 )
 from services.github.client import GithubClient, GithubApiException
 from services.github.oauth import GithubOauthRecord, GithubOauth
+from services.github.pool import GithubConnectionPool
 from services.auth import Auth
 from uuid import uuid4
 
@@ -61,6 +62,7 @@ async def authenticate_gh_user(
     code: str | None = None,
     error: str | None = None,
     gh_oauth: GithubOauth = Depends(get_gh_oauth),
+    gh_pool: GithubConnectionPool = Depends(get_gh_pool),
 ):
     if not gh_oauth.store.has(state):
         LOGGER.error(f"Github OAuth state '{state}' doesn't exist in store")
@@ -87,7 +89,7 @@ async def authenticate_gh_user(
 
     try:
         access_token = await gh_oauth.get_access_token(code)
-        gh_client = GithubClient(access_token)
+        gh_client = GithubClient(access_token, gh_pool.client)
         user = await gh_client.get_user()
         token = Auth.encode(user["username"])
         return redirect_with_token(token, oauth_record["referrer"])
@@ -1,12 +1,23 @@
 from fastapi import FastAPI, WebSocketDisconnect, Depends
-from services import Connection, ConnectionManager, GithubClient, GithubApiException
-from deps import get_connection, get_connection_manager, get_gh_client
+from services import (
+    BackgroundTasks,
+    Connection,
+    ConnectionManager,
+    GithubClient,
+    GithubApiException,
+)
+from deps import (
+    get_background_tasks,
+    get_connection,
+    get_connection_manager,
+    get_gh_client,
+    get_session_states,
+)
 from enum import IntEnum
 from pydantic import BaseModel
 from metrics import instrument, WS_CONNECTIONS
 from enum import Enum
-from tortoise.exceptions import DoesNotExist
-from db import Views, Models, Crud
+from db import Views, Models, Crud, State
 from dataclasses import dataclass
 import logging
 
@@ -20,12 +31,15 @@ class WSAppStatusCodes(IntEnum):
     SESSION_NOT_FOUND = 4002
     GITHUB_API_ERRORED = 4003
     NOT_ALLOWED = 4004
+    LOADING_FILES_ERRORED = 4005
 
 
 class WSRequestType(IntEnum):
     ADD_COMMENT = 1
     READY = 2
     WAIT = 3
+    # sent by a client that missed a broadcast, which it tells from a gap in sequence numbers
+    RESYNC = 4
 
 
 @dataclass
@@ -35,6 +49,8 @@ class WSEventContext:
     connection: Connection
     connection_manager: ConnectionManager
     gh_client: GithubClient
+    background_tasks: BackgroundTasks
+    session_states: State.SessionStateStore
 
 
 class WSResponseType(IntEnum):
@@ -45,7 +61,11 @@ class WSResponseType(IntEnum):
     SOURCE_CODE = 4
     COMMENTS = 5
     BATCH = 6
+    # no longer sent, COMMENT_ADDED took its place
     NEW_COMMENT = 7
+    PLAYER_UPDATED = 8
+    COMMENT_ADDED = 9
+    SNAPSHOT = 10
 
 
 class AddCommentRequest(BaseModel):
@@ -86,8 +106,13 @@ class CommentsResponse(BaseModel):
     comments: list[Views.Comment]
 
 
-class NewCommentResponse(BaseModel):
-    message_type: WSResponseType = WSResponseType.NEW_COMMENT
+class PlayerUpdatedResponse(BaseModel):
+    message_type: WSResponseType = WSResponseType.PLAYER_UPDATED
+    player: Views.Player
+
+
+class CommentAddedResponse(BaseModel):
+    message_type: WSResponseType = WSResponseType.COMMENT_ADDED
     comment: Views.Comment
 
 
@@ -100,14 +125,29 @@ Response = (
     | AlertResponse
     | CodeResponse
     | CommentsResponse
-    | NewCommentResponse
+    | PlayerUpdatedResponse
+    | CommentAddedResponse
     | GameFinishedResponse
     | None
 )
 
+"""
+Everything broadcast to a session goes out as a batch with the session's next sequence number. Batches carry
+deltas, i.e. a player's updated state or an added comment, rather than the whole lobby or comments, so what an event
+costs doesn't grow with the session. A client applies batches in sequence, and asks for a snapshot of the whole
+session (RESYNC) when it finds one missing. The snapshot carries the sequence number of the last batch it includes.
+"""
+
 
 class BatchResponse(BaseModel):
-    message_type: WSRequestType = WSResponseType.BATCH
+    message_type: WSResponseType = WSResponseType.BATCH
+    seq: int
+    messages: list[Response]
+
+
+class SnapshotResponse(BaseModel):
+    message_type: WSResponseType = WSResponseType.SNAPSHOT
+    seq: int
     messages: list[Response]
 
 
@@ -117,30 +157,66 @@ class WSAppPolicyViolation(Exception):
         self.reason = reason
 
 
-async def get_lobby(session_id: str):
-    players = await Views.get_players(session_id)
-    return LobbyResponse(players=players)
+# the lobby, code and comments are sent already serialized, from snapshots kept until that part of the state changes
+def get_lobby(state: State.SessionState):
+    return state.get_snapshot(
+        "lobby",
+        state.lobby_version,
+        lambda: LobbyResponse(players=state.get_players()).dict(),
+    )
 
 
-async def get_code(session_id: str):
-    try:
-        code = await Views.get_code(session_id)
-        return CodeResponse(code=code)
-    except DoesNotExist:
+def get_code(state: State.SessionState):
+    if state.code is None:
         return None
+    return state.get_snapshot(
+        "code", state.code_version, lambda: CodeResponse(code=state.code).dict()
+    )
 
 
-async def get_comments(session_id: str):
-    try:
-        comments = await Views.get_comments(session_id)
-        return CommentsResponse(comments=comments)
-    except DoesNotExist:
+def get_comments(state: State.SessionState):
+    if state.code is None:
         return None
+    return state.get_snapshot(
+        "comments",
+        state.comments_version,
+        lambda: CommentsResponse(comments=state.comments).dict(),
+    )
+
 
+def get_player_updated(state: State.SessionState, player_name: str):
+    return PlayerUpdatedResponse(player=state.get_player(player_name))
 
-async def get_new_comment(new_comment_id: str):
-    comment = await Views.get_comment(new_comment_id)
-    return NewCommentResponse(comment=comment)
+
+def get_snapshot(state: State.SessionState):
+    if state.is_terminated:
+        messages = [get_lobby(state), GameFinishedResponse().dict()]
+    else:
+        messages = [get_lobby(state), get_code(state), get_comments(state)]
+    # the same as SnapshotResponse(seq=state.seq, messages=messages).dict()
+    return {
+        "message_type": WSResponseType.SNAPSHOT,
+        "seq": state.seq,
+        "messages": [message for message in messages if message is not None],
+    }
+
+
+def stage_next_code(ctx: WSEventContext):
+    ctx.background_tasks.spawn(
+        f"stage_next_code:{ctx.session_id}",
+        Crud.stage_next_code,
+        ctx.session_id,
+        ctx.gh_client,
+    )
+
+
+def replenish_pool(ctx: WSEventContext):
+    ctx.background_tasks.spawn(
+        f"replenish_pool:{ctx.session_id}",
+        Crud.replenish_pool,
+        ctx.session_id,
+        ctx.gh_client,
+    )
 
 
 def get_alert(message: str, type: AlertType = AlertType.POSITIVE):
@@ -148,49 +224,66 @@ def get_alert(message: str, type: AlertType = AlertType.POSITIVE):
     return AlertResponse(alert=alert)
 
 
-async def broadcast(ctx: WSEventContext, *messages: Response):
-    messages = list(filter(lambda m: m is not None, messages))
+async def broadcast(ctx: WSEventContext, *messages: Response | dict):
+    messages = [
+        message if isinstance(message, dict) else message.dict()
+        for message in messages
+        if message is not None
+    ]
     if len(messages) > 0:
+        state = await ctx.session_states.get(ctx.session_id)
+        # the same as BatchResponse(seq=..., messages=messages).dict(), without serializing the snapshots all over again
         await ctx.connection_manager.broadcast(
-            ctx.session_id, BatchResponse(messages=messages).dict()
+            ctx.session_id,
+            {
+                "message_type": WSResponseType.BATCH,
+                "seq": state.next_seq(),
+                "messages": messages,
+            },
         )
 
 
 @instrument
 async def on_advance(ctx: WSEventContext):
     await broadcast(ctx, get_alert("Advancing...", type=AlertType.NEUTRAL))
-    await Crud.advance(ctx.session_id, ctx.gh_client)
-    lobby = await get_lobby(ctx.session_id)
-    if await Crud.is_terminated(ctx.session_id):
-        await broadcast(ctx, lobby, GameFinishedResponse())
+    state = await ctx.session_states.get(ctx.session_id)
+    await ctx.session_states.flush(ctx.session_id)
+    session = await Crud.advance(ctx.session_id, ctx.gh_client)
+    await ctx.session_states.on_advanced(state, session)
+    if state.is_terminated:
+        await broadcast(ctx, get_lobby(state), GameFinishedResponse())
     else:
-        await broadcast(ctx, lobby, await get_code(ctx.session_id))
+        await broadcast(ctx, get_lobby(state), get_code(state))
+        stage_next_code(ctx)
+        replenish_pool(ctx)
 
 
 @instrument
 async def on_leave(ctx: WSEventContext):
+    state = await ctx.session_states.get(ctx.session_id)
+    await ctx.session_states.flush(ctx.session_id)
     await Crud.leave(ctx.session_id, ctx.player_name)
+    ctx.session_states.on_left(state, ctx.player_name)
     ctx.connection_manager.remove(ctx.connection)
     await broadcast(
         ctx,
-        await get_lobby(ctx.session_id),
+        get_player_updated(state, ctx.player_name),
         get_alert(f"{ctx.player_name} has left", type=AlertType.NEGATIVE),
     )
-    if await Crud.is_ready_to_advance(ctx.session_id):
+    if state.is_ready_to_advance:
         await on_advance(ctx)
 
 
 @instrument
 async def on_join(ctx: WSEventContext):
+    state = await ctx.session_states.get(ctx.session_id)
+    await ctx.session_states.flush(ctx.session_id)
+    is_loading_files = False
     try:
-        await Crud.join(ctx.session_id, ctx.player_name, ctx.gh_client)
-    except GithubApiException as e:
-        await ctx.connection.close(
-            code=WSAppStatusCodes.GITHUB_API_ERRORED,
-            reason=f"{ctx.player_name} is unable to join due to Github API errors",
-        )
-        raise e
-    except Crud.PlayerRejoiningError:
+        is_loading_files = await Crud.join(ctx.session_id, ctx.player_name)
+    except Crud.PlayerRejoiningError as e:
+        # the load is tried again here, loads of the same player's files can overlap
+        is_loading_files = e.is_loading_files
         other_connection = ctx.connection_manager.get_or_none(
             ctx.session_id, ctx.player_name
         )
@@ -201,21 +294,59 @@ async def on_join(ctx: WSEventContext):
                 code=WSAppStatusCodes.SWITCHING_CONNECTIONS,
                 reason="You connected elsewhere. Refresh to connect at this location.",
             )
+    await ctx.session_states.on_joined(state)
 
+    # the joining player is sent the whole session, and everyone else only the player that joined
+    await ctx.connection.send(get_snapshot(state))
     ctx.connection_manager.add(ctx.connection)
-    lobby = await get_lobby(ctx.session_id)
-    alert = get_alert(f"{ctx.player_name} has joined")
-    if await Crud.is_terminated(ctx.session_id):
-        await broadcast(ctx, lobby, alert, GameFinishedResponse())
-    else:
-        await broadcast(ctx, lobby, alert, await get_code(ctx.session_id), await get_comments(ctx.session_id))
+    await broadcast(
+        ctx,
+        get_player_updated(state, ctx.player_name),
+        get_alert(f"{ctx.player_name} has joined"),
+    )
+    if state.is_terminated:
+        return
+    stage_next_code(ctx)
+
+    # the player is in the lobby already, while their repos and files load without holding up the session
+    if is_loading_files:
+        await on_load_player_files(ctx)
+
+
+@instrument
+async def on_load_player_files(ctx: WSEventContext):
+    try:
+        await Crud.load_player_files(ctx.session_id, ctx.player_name, ctx.gh_client)
+    except Exception as e:
+        # a player left loading forever would keep the session from ever advancing
+        if isinstance(e, GithubApiException):
+            code = WSAppStatusCodes.GITHUB_API_ERRORED
+            reason = f"{ctx.player_name} is unable to join due to Github API errors"
+        else:
+            code = WSAppStatusCodes.LOADING_FILES_ERRORED
+            reason = (
+                f"{ctx.player_name} is unable to join as their files failed to load"
+            )
+        # unless the player connected elsewhere in the meantime, which closed this connection already
+        connection = ctx.connection_manager.get_or_none(ctx.session_id, ctx.player_name)
+        if connection is ctx.connection:
+            await ctx.connection.close(code=code, reason=reason)
+            await on_leave(ctx)
+        raise e
+    state = await ctx.session_states.get(ctx.session_id)
+    ctx.session_states.on_files_loaded(state, ctx.player_name)
+    stage_next_code(ctx)
+    # everyone may have readied up while the files were loading
+    if state.is_ready_to_advance:
+        await on_advance(ctx)
 
 
 @instrument
 async def on_add_comment(ctx: WSEventContext, add_comment: AddCommentRequest):
+    state = await ctx.session_states.get(ctx.session_id)
     try:
-        comment_id = await Crud.add_comment(
-            ctx.session_id,
+        comment = ctx.session_states.add_comment(
+            state,
             add_comment.content,
             add_comment.line_start,
             add_comment.line_end,
@@ -223,11 +354,7 @@ async def on_add_comment(ctx: WSEventContext, add_comment: AddCommentRequest):
             ctx.player_name,
         )
 
-        await broadcast(
-            ctx,
-            await get_comments(ctx.session_id),
-            await get_new_comment(comment_id),
-        )
+        await broadcast(ctx, CommentAddedResponse(comment=comment))
     except Crud.NoSelectedCodeError:
         raise WSAppPolicyViolation(
             code=WSAppStatusCodes.NOT_ALLOWED,
@@ -237,16 +364,24 @@ async def on_add_comment(ctx: WSEventContext, add_comment: AddCommentRequest):
 
 @instrument
 async def on_ready(ctx: WSEventContext):
-    await Crud.ready_up(ctx.session_id, ctx.player_name)
-    await broadcast(ctx, await get_lobby(ctx.session_id))
-    if await Crud.is_ready_to_advance(ctx.session_id):
+    state = await ctx.session_states.get(ctx.session_id)
+    ctx.session_states.ready_up(state, ctx.player_name)
+    await broadcast(ctx, get_player_updated(state, ctx.player_name))
+    if state.is_ready_to_advance:
         await on_advance(ctx)
 
 
 @instrument
 async def on_wait(ctx: WSEventContext):
-    await Crud.wait(ctx.session_id, ctx.player_name)
-    await broadcast(ctx, await get_lobby(ctx.session_id))
+    state = await ctx.session_states.get(ctx.session_id)
+    ctx.session_states.wait(state, ctx.player_name)
+    await broadcast(ctx, get_player_updated(state, ctx.player_name))
+
+
+@instrument
+async def on_resync(ctx: WSEventContext):
+    state = await ctx.session_states.get(ctx.session_id)
+    await ctx.connection.send(get_snapshot(state))
 
 
 @socket_app.websocket("/{session_id}")
@@ -254,6 +389,8 @@ async def on_websocket_event(
     connection: Connection = Depends(get_connection),
     connection_manager: ConnectionManager = Depends(get_connection_manager),
     gh_client: GithubClient = Depends(get_gh_client),
+    background_tasks: BackgroundTasks = Depends(get_background_tasks),
+    session_states: State.SessionStateStore = Depends(get_session_states),
 ):
     await connection.accept()
     if not await Models.Session.exists(id=connection.session_id):
@@ -269,6 +406,8 @@ async def on_websocket_event(
         connection=connection,
         connection_manager=connection_manager,
         gh_client=gh_client,
+        background_tasks=background_tasks,
+        session_states=session_states,
     )
 
     try:
@@ -287,6 +426,8 @@ async def on_websocket_event(
                     await on_add_comment(ctx, AddCommentRequest(**data))
                 elif request_type == WSRequestType.READY:
                     await on_ready(ctx)
+                elif request_type == WSRequestType.RESYNC:
+                    await on_resync(ctx)
                 else:
                     await on_wait(ctx)
             except ValueError as e:
@@ -1,4 +1,15 @@
 from .github.client import GithubClient, GithubApiException
+from .github.blobs import BlobCache, BlobStore, MemoryBlobStore, DiskBlobStore
+from .github.cache import (
+    CachedResponse,
+    ResponseCache,
+    MemoryResponseCache,
+    TieredResponseCache,
+)
+from .github.scheduler import GithubRequestScheduler, Priority
+from .github.singleflight import SingleFlight
+from .github.pool import GithubConnectionPool, PoolStats
 from .github.oauth import GithubOauth, GithubOauthRecord, GithubOauthStore
 from .auth import Auth, Context, ExpiredToken, InvalidToken
 from .connection import Connection, ConnectionManager
+from .background import BackgroundTasks
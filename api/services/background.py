@@ -0,0 +1,37 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+LOGGER = logging.getLogger(__name__)
+
+"""
+Runs work that shouldn't hold up the WS event that triggered it, i.e. staging the next round's code.
+Tasks are keyed, so spawning a task while another with the same key is still running is a no-op.
+"""
+
+
+class BackgroundTasks:
+    def __init__(self):
+        self.__tasks: dict[str, asyncio.Task] = {}
+
+    def is_running(self, key: str):
+        return key in self.__tasks
+
+    def spawn(self, key: str, func: Callable[..., Awaitable], *args):
+        if key in self.__tasks:
+            return
+        self.__tasks[key] = asyncio.create_task(self.__run(key, func, *args))
+
+    async def __run(self, key: str, func: Callable[..., Awaitable], *args):
+        try:
+            await func(*args)
+        except Exception as e:
+            LOGGER.exception(e)
+        finally:
+            del self.__tasks[key]
+
+    async def close(self):
+        tasks = list(self.__tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
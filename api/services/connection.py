@@ -1,26 +1,45 @@
 from fastapi import WebSocket, status
 from starlette.websockets import WebSocketState
+from .encoding import Encoding, Frame, encode, decode_json
+from metrics import WS_SENT_BYTES
 import anyio
 import logging
 
 LOGGER = logging.getLogger(__name__)
 
+# clients choose how messages are encoded by offering one of these Websocket subprotocols, JSON if they offer none
+SUBPROTOCOLS = {
+    "gitgame.json": Encoding.JSON,
+    "gitgame.msgpack": Encoding.MSGPACK,
+}
+
 
 class Connection:
     def __init__(self, session_id: str, player_name: str, websocket: WebSocket):
         self.session_id = session_id
         self.player_name = player_name
         self.__websocket = websocket
+        # the first offered subprotocol that is supported, clients still send their requests as JSON
+        offered = websocket.scope.get("subprotocols", [])
+        self.subprotocol = next((s for s in offered if s in SUBPROTOCOLS), None)
+        self.encoding = SUBPROTOCOLS.get(self.subprotocol, Encoding.JSON)
 
     async def accept(self):
-        await self.__websocket.accept()
+        await self.__websocket.accept(subprotocol=self.subprotocol)
 
     async def send(self, data: dict):
+        await self.send_frame(encode(data, self.encoding))
+
+    async def send_frame(self, frame: Frame):
         if self.__websocket.client_state == WebSocketState.CONNECTED:
-            await self.__websocket.send_json(data)
+            WS_SENT_BYTES.labels(self.encoding.value).inc(frame.size)
+            if isinstance(frame.payload, bytes):
+                await self.__websocket.send_bytes(frame.payload)
+            else:
+                await self.__websocket.send_text(frame.payload)
         else:
             LOGGER.warn(
-                f"Sending {data} to closed connection ({self.player_name}, {self.session_id})"
+                f"Sending {frame.payload} to closed connection ({self.player_name}, {self.session_id})"
             )
 
     async def close(
@@ -32,7 +51,7 @@ class Connection:
         )
 
     async def recieve(self) -> dict:
-        return await self.__websocket.receive_json()
+        return decode_json(await self.__websocket.receive_text())
 
     def __eq__(self, other: "Connection"):
         return (
@@ -68,6 +87,12 @@ class ConnectionManager:
 
     async def broadcast(self, session_id: str, data: dict):
         if session_id in self.__sessions:
+            # encoded once per encoding for the whole session, connections using the same one are sent the same frame
+            connections = self.__sessions[session_id]
+            frames = {
+                encoding: encode(data, encoding)
+                for encoding in {connection.encoding for connection in connections}
+            }
             async with anyio.create_task_group() as tg:
-                for connection in self.__sessions[session_id]:
-                    tg.start_soon(connection.send, data)
+                for connection in connections:
+                    tg.start_soon(connection.send_frame, frames[connection.encoding])
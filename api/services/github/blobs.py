@@ -0,0 +1,146 @@
+import os
+import anyio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from metrics import GITHUB_BLOB_CACHE_REQUESTS
+
+
+class BlobStore(ABC):
+    @abstractmethod
+    async def get(self, sha: str) -> str | None:
+        ...
+
+    @abstractmethod
+    async def put(self, sha: str, content: str):
+        ...
+
+
+class MemoryBlobStore(BlobStore):
+    def __init__(self, max_bytes: int):
+        self.__max_bytes = max_bytes
+        self.__size = 0
+        # the blobs along with their size in bytes as UTF-8, as len() counts the characters of a str
+        self.__blobs: OrderedDict[str, tuple[str, int]] = OrderedDict()
+
+    async def get(self, sha: str) -> str | None:
+        if sha not in self.__blobs:
+            return None
+        self.__blobs.move_to_end(sha)
+        return self.__blobs[sha][0]
+
+    async def put(self, sha: str, content: str):
+        if sha in self.__blobs:
+            self.__blobs.move_to_end(sha)
+            return
+        size = len(content.encode())
+        self.__blobs[sha] = (content, size)
+        self.__size += size
+        while self.__size > self.__max_bytes:
+            _, (_, evicted_size) = self.__blobs.popitem(last=False)
+            self.__size -= evicted_size
+
+
+class DiskBlobStore(BlobStore):
+    """
+    Blobs are stored as files named after their sha. Recency is tracked through the file mtimes, so the LRU
+    order survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.__directory = Path(directory)
+        self.__max_bytes = max_bytes
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        self.__size = 0
+        self.__sizes: OrderedDict[str, int] = OrderedDict()
+        blob_paths = sorted(
+            [path for path in self.__directory.iterdir() if path.suffix != ".tmp"],
+            key=lambda path: path.stat().st_mtime,
+        )
+        for blob_path in blob_paths:
+            self.__sizes[blob_path.name] = blob_path.stat().st_size
+            self.__size += self.__sizes[blob_path.name]
+
+    def __get_sync(self, sha: str):
+        blob_path = self.__directory / sha
+        content = blob_path.read_text(encoding="utf-8")
+        os.utime(blob_path)
+        return content
+
+    def __put_sync(self, sha: str, content: str):
+        blob_path = self.__directory / sha
+        temp_path = self.__directory / f".{sha}.tmp"
+        temp_path.write_text(content, encoding="utf-8")
+        temp_path.replace(blob_path)
+        return blob_path.stat().st_size
+
+    def __delete_sync(self, shas: list[str]):
+        for sha in shas:
+            (self.__directory / sha).unlink(missing_ok=True)
+
+    async def get(self, sha: str) -> str | None:
+        if sha not in self.__sizes:
+            return None
+        self.__sizes.move_to_end(sha)
+        try:
+            return await anyio.to_thread.run_sync(self.__get_sync, sha)
+        except FileNotFoundError:
+            self.__size -= self.__sizes.pop(sha, 0)
+            return None
+
+    async def put(self, sha: str, content: str):
+        if sha in self.__sizes:
+            self.__sizes.move_to_end(sha)
+            return
+        size = await anyio.to_thread.run_sync(self.__put_sync, sha, content)
+        # a concurrent put of the same blob may have been accounted for while this one was written
+        if sha in self.__sizes:
+            self.__sizes.move_to_end(sha)
+            return
+        self.__sizes[sha] = size
+        self.__size += size
+        evicted_shas = []
+        while self.__size > self.__max_bytes and len(self.__sizes) > 1:
+            evicted_sha, evicted_size = self.__sizes.popitem(last=False)
+            evicted_shas.append(evicted_sha)
+            self.__size -= evicted_size
+        if len(evicted_shas) > 0:
+            await anyio.to_thread.run_sync(self.__delete_sync, evicted_shas)
+
+
+"""
+A content-addressed cache of downloaded source files, keyed by the git blob sha of each file.
+Since a blob sha identifies its content, entries never go stale and only need to be evicted for space.
+"""
+
+
+class BlobCache:
+    def __init__(self, memory: BlobStore, disk: BlobStore | None = None):
+        self.__memory = memory
+        self.__disk = disk
+
+    async def get(self, sha: str) -> str | None:
+        content = await self.__memory.get(sha)
+        if content is not None:
+            GITHUB_BLOB_CACHE_REQUESTS.labels("memory").inc()
+            return content
+        if self.__disk is not None:
+            content = await self.__disk.get(sha)
+            if content is not None:
+                GITHUB_BLOB_CACHE_REQUESTS.labels("disk").inc()
+                await self.__memory.put(sha, content)
+                return content
+        GITHUB_BLOB_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    async def put(self, sha: str, content: str):
+        await self.__memory.put(sha, content)
+        if self.__disk is not None:
+            await self.__disk.put(sha, content)
+
+    async def prefetch(self, sha: str, content: str):
+        # Blobs stored ahead of being asked for, such as a whole repo's files, only go to the disk tier, from where
+        # they are promoted once read. In the memory tier they would evict the blobs actually being read, so they
+        # aren't kept at all without a disk tier.
+        if self.__disk is not None:
+            await self.__disk.put(sha, content)
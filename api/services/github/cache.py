@@ -0,0 +1,100 @@
+import orjson
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, TypedDict
+from urllib.parse import urlencode
+
+
+class CachedResponse(TypedDict):
+    etag: str | None
+    last_modified: str | None
+    link: str | None
+    body: Any
+
+
+def get_cache_key(endpoint: str, params: dict | None = None) -> str:
+    if not params:
+        return endpoint
+    return f"{endpoint}?{urlencode(sorted(params.items()))}"
+
+
+def get_conditional_headers(cached: CachedResponse) -> dict[str, str]:
+    headers = {}
+    if cached["etag"] is not None:
+        headers["If-None-Match"] = cached["etag"]
+    if cached["last_modified"] is not None:
+        headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+
+"""
+Stores Github API responses alongside their validators (ETag/Last-Modified), so that repeated
+requests can be made conditionally. Github doesn't count 304 responses against the rate limit.
+"""
+
+
+class ResponseCache(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> CachedResponse | None:
+        ...
+
+    @abstractmethod
+    async def put(self, key: str, response: CachedResponse):
+        ...
+
+
+def get_response_size(response: CachedResponse):
+    # the size of the body as JSON, which the parsed body held in memory is roughly proportional to
+    return len(orjson.dumps(response["body"]))
+
+
+class MemoryResponseCache(ResponseCache):
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__size = 0
+        self.__entries: OrderedDict[str, tuple[CachedResponse, int]] = OrderedDict()
+
+    async def get(self, key: str) -> CachedResponse | None:
+        if key not in self.__entries:
+            return None
+        self.__entries.move_to_end(key)
+        return self.__entries[key][0]
+
+    async def put(self, key: str, response: CachedResponse):
+        size = get_response_size(response)
+        if key in self.__entries:
+            self.__size -= self.__entries.pop(key)[1]
+        # a response that doesn't fit would evict every other one
+        if size > self.__max_bytes:
+            return
+        self.__entries[key] = (response, size)
+        self.__size += size
+        while (
+            len(self.__entries) > self.__max_entries or self.__size > self.__max_bytes
+        ):
+            _, (_, evicted_size) = self.__entries.popitem(last=False)
+            self.__size -= evicted_size
+
+
+class TieredResponseCache(ResponseCache):
+    """
+    Keeps a (per worker) memory cache in front of a shared cache, so that workers can reuse
+    each other's responses without paying for the shared lookup on every request.
+    """
+
+    def __init__(self, memory: ResponseCache, shared: ResponseCache):
+        self.__memory = memory
+        self.__shared = shared
+
+    async def get(self, key: str) -> CachedResponse | None:
+        response = await self.__memory.get(key)
+        if response is None:
+            response = await self.__shared.get(key)
+            if response is not None:
+                await self.__memory.put(key, response)
+        return response
+
+    async def put(self, key: str, response: CachedResponse):
+        await self.__memory.put(key, response)
+        await self.__shared.put(key, response)
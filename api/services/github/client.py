@@ -1,12 +1,32 @@
+import anyio
+import codecs
 import logging
-from typing import TypedDict
-from httpx import AsyncClient
+from contextlib import asynccontextmanager
+from tempfile import SpooledTemporaryFile
+from enum import Enum
+from typing import Awaitable, Callable, TypedDict, TypeVar
+from httpx import AsyncClient, Response
 from fastapi import status
 from pathlib import Path
 from datetime import datetime
+from config import GITHUB_API_URL, GITHUB_RAW_URL, GITHUB_URL
+from metrics import GITHUB_RESPONSE_CACHE_REQUESTS, GITHUB_UNSUPPORTED_DOWNLOADS
+from .blobs import BlobCache
+from .scheduler import GithubRequestScheduler, Priority
+from .singleflight import SingleFlight
+from .tarball import extract_supported_files
+from .graphql import REPOS_QUERY, get_repo_trees_query, get_tree_blobs
+from .cache import (
+    CachedResponse,
+    ResponseCache,
+    get_cache_key,
+    get_conditional_headers,
+)
 
 LOGGER = logging.getLogger()
 
+T = TypeVar("T")
+
 
 class RepositoryDict(TypedDict):
     name: str
@@ -18,6 +38,7 @@ class FileDict(TypedDict):
     path: str
     download_url: str
     visit_url: str
+    sha: str
 
 
 class RateLimitResult(TypedDict):
@@ -38,70 +59,221 @@ class GithubApiException(Exception):
         self.status_code = status_code
         self.text = text
 
+    @property
+    def is_not_found(self):
+        return self.status_code == status.HTTP_404_NOT_FOUND
+
+    @property
+    def is_empty_repository(self):
+        # Github answers 409 for the trees of a repo without any commit
+        return self.status_code == status.HTTP_409_CONFLICT
+
     def __str__(self):
         return f"Github API request to '{self.gh_endpoint}' resulted in '{self.status_code}': '{self.text}'"
 
 
+class TarballTooLargeError(Exception):
+    def __init__(self, full_repo_name: str, max_tarball_size: int):
+        self.full_repo_name = full_repo_name
+        self.max_tarball_size = max_tarball_size
+
+    def __str__(self):
+        return (
+            f"Tarball of '{self.full_repo_name}' exceeds {self.max_tarball_size} bytes"
+        )
+
+
+class UnsupportedFileError(Exception):
+    class Reason(str, Enum):
+        TOO_LARGE = "too_large"
+        BINARY = "binary"
+        LFS_POINTER = "lfs_pointer"
+
+    def __init__(self, gh_download_url: str, reason: Reason):
+        self.gh_download_url = gh_download_url
+        self.reason = reason
+
+    def __str__(self):
+        return f"File at '{self.gh_download_url}' is unsupported: '{self.reason.value}'"
+
+
 MAX_FILE_SIZE = 15000  # 15kb
+LFS_POINTER_PREFIX = b"version https://git-lfs.github.com/spec/"
+MAX_TARBALL_SIZE = 20 * 1024 * 1024  # 20mb
+TARBALL_SPOOL_SIZE = 1024 * 1024  # tarballs larger than 1mb are spooled to disk
+MAX_RATE_LIMITED_ATTEMPTS = 2
+
+
+def get_download_url(full_repo_name: str, default_branch: str, file_path: str):
+    return f"{GITHUB_RAW_URL}/{full_repo_name}/{default_branch}/{file_path}"
+
+
+def get_visit_url(full_repo_name: str, default_branch: str, file_path: str):
+    return f"{GITHUB_URL}/{full_repo_name}/blob/{default_branch}/{file_path}"
+
+
+def get_file_dict(full_repo_name: str, default_branch: str, path: str, sha: str):
+    return FileDict(
+        path=path,
+        download_url=get_download_url(full_repo_name, default_branch, path),
+        visit_url=get_visit_url(full_repo_name, default_branch, path),
+        sha=sha,
+    )
+
+
+def is_supported_file(path: str, supported_extensions: set[str]):
+    return Path(path).suffix[1:] in supported_extensions
+
+
+def is_rate_limited(response: Response):
+    return response.status_code in [
+        status.HTTP_403_FORBIDDEN,
+        status.HTTP_429_TOO_MANY_REQUESTS,
+    ] and (
+        response.headers.get("x-ratelimit-remaining") == "0"
+        or "retry-after" in response.headers
+    )
 
 
 class GithubClient:
-    def __init__(self, access_token: str):
+    def __init__(
+        self,
+        access_token: str,
+        http_client: AsyncClient,
+        response_cache: ResponseCache | None = None,
+        blob_cache: BlobCache | None = None,
+        scheduler: GithubRequestScheduler | None = None,
+        single_flight: SingleFlight | None = None,
+    ):
         self.access_token = access_token
+        self.__http_client = http_client
+        self.__response_cache = response_cache
+        self.__blob_cache = blob_cache
+        self.__scheduler = scheduler
+        self.__single_flight = single_flight
         self.HEADERS = {
             "Authorization": f"Bearer {access_token}",
             "Accept": "application/vnd.github+json",
         }
 
-    async def get_rate_limit(self):
-        endpoint = "https://api.github.com/rate_limit"
-        async with AsyncClient() as client:
-            response = await client.get(endpoint, headers=self.HEADERS)
-            core = response.json()["resources"]["core"]
-            return RateLimitResult(
-                limit=core["limit"],
-                used=core["used"],
-                reset=datetime.fromtimestamp(core["reset"]),
+    async def __send(
+        self, method: str, url: str, priority: Priority, resource="core", **kwargs
+    ):
+        attempts = 0
+        while True:
+            if self.__scheduler is not None:
+                await self.__scheduler.acquire(priority, resource)
+            response = await self.__http_client.request(method, url, **kwargs)
+            if self.__scheduler is None:
+                return response
+            self.__scheduler.observe(response.headers)
+            attempts += 1
+            # the scheduler now knows the quota ran out, so a retry waits for the window to reset
+            if not is_rate_limited(response) or attempts == MAX_RATE_LIMITED_ATTEMPTS:
+                return response
+
+    @asynccontextmanager
+    async def __stream(
+        self, method: str, url: str, priority: Priority, resource="core", **kwargs
+    ):
+        if self.__scheduler is not None:
+            await self.__scheduler.acquire(priority, resource)
+        async with self.__http_client.stream(method, url, **kwargs) as response:
+            if self.__scheduler is not None:
+                self.__scheduler.observe(response.headers)
+            yield response
+
+    async def __coalesce(self, key: str, func: Callable[..., Awaitable[T]], *args) -> T:
+        if self.__single_flight is None:
+            return await func(*args)
+        return await self.__single_flight.do(key, func, *args)
+
+    async def __get_json(
+        self, endpoint: str, params: dict | None = None, priority=Priority.BACKGROUND
+    ):
+        key = get_cache_key(endpoint, params)
+        return await self.__coalesce(
+            f"GET {key}", self.__fetch_json, endpoint, params, key, priority
+        )
+
+    async def __fetch_json(
+        self, endpoint: str, params: dict | None, key: str, priority: Priority
+    ):
+        # revalidates a previously cached response via a conditional request when possible
+        cached = None
+        headers = self.HEADERS
+        if self.__response_cache is not None:
+            cached = await self.__response_cache.get(key)
+            if cached is not None:
+                headers = {**headers, **get_conditional_headers(cached)}
+
+        response = await self.__send(
+            "GET", endpoint, priority, params=params, headers=headers
+        )
+        if response.status_code == status.HTTP_304_NOT_MODIFIED and cached is not None:
+            GITHUB_RESPONSE_CACHE_REQUESTS.labels("hit").inc()
+            return cached
+
+        if response.status_code != status.HTTP_200_OK:
+            raise GithubApiException(
+                response.request.url, response.status_code, response.text
             )
 
+        fresh = CachedResponse(
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            link=response.headers.get("link"),
+            body=response.json(),
+        )
+        if self.__response_cache is not None:
+            GITHUB_RESPONSE_CACHE_REQUESTS.labels("miss").inc()
+            if fresh["etag"] is not None or fresh["last_modified"] is not None:
+                await self.__response_cache.put(key, fresh)
+        return fresh
+
+    async def get_rate_limit(self):
+        endpoint = f"{GITHUB_API_URL}/rate_limit"
+        response = await self.__send(
+            "GET", endpoint, Priority.INTERACTIVE, headers=self.HEADERS
+        )
+        core = response.json()["resources"]["core"]
+        return RateLimitResult(
+            limit=core["limit"],
+            used=core["used"],
+            reset=datetime.fromtimestamp(core["reset"]),
+        )
+
     async def get_non_forked_repos(
         self, username: str, min_repos: int = 100, page: int = 1
     ):
-        endpoint = f"https://api.github.com/users/{username}/repos"
+        endpoint = f"{GITHUB_API_URL}/users/{username}/repos"
         repo_dicts: list[RepositoryDict] = []
         can_get_next_page = True
-        async with AsyncClient() as client:
-            while len(repo_dicts) < min_repos and can_get_next_page:
-                params = {
-                    "type": "owner",
-                    "sort": "pushed",
-                    "direction": "asc",
-                    "per_page": min(min_repos, 100),
-                    "page": page,
-                }
-                response = await client.get(
-                    endpoint, params=params, headers=self.HEADERS
-                )
-                if response.status_code != status.HTTP_200_OK:
-                    raise GithubApiException(
-                        response.request.url, response.status_code, response.text
-                    )
-                for repo in response.json():
-                    if not repo["fork"] and repo["size"] > 0:
-                        repo_dicts.append(
-                            RepositoryDict(
-                                name=repo["full_name"],
-                                last_pushed_at=datetime.fromisoformat(
-                                    repo["pushed_at"].replace("Z", "+00:00")
-                                ),
-                                default_branch=repo["default_branch"],
-                            )
+        while len(repo_dicts) < min_repos and can_get_next_page:
+            params = {
+                "type": "owner",
+                "sort": "pushed",
+                "direction": "asc",
+                "per_page": min(min_repos, 100),
+                "page": page,
+            }
+            response = await self.__get_json(endpoint, params)
+            for repo in response["body"]:
+                if not repo["fork"] and repo["size"] > 0:
+                    repo_dicts.append(
+                        RepositoryDict(
+                            name=repo["full_name"],
+                            last_pushed_at=datetime.fromisoformat(
+                                repo["pushed_at"].replace("Z", "+00:00")
+                            ),
+                            default_branch=repo["default_branch"],
                         )
+                    )
 
-                can_get_next_page = ("link" in response.headers) and (
-                    'rel="next"' in response.headers["link"]
-                )
-                page += 1
+            can_get_next_page = (response["link"] is not None) and (
+                'rel="next"' in response["link"]
+            )
+            page += 1
 
         next_page = None
         if can_get_next_page:
@@ -115,68 +287,298 @@ class GithubClient:
         supported_extensions: set[str],
         max_file_size: int = MAX_FILE_SIZE,
     ):
-        def get_download_url(file_path: str):
-            return f"https://raw.githubusercontent.com/{full_repo_name}/{default_branch}/{file_path}"
+        endpoint = f"{GITHUB_API_URL}/repos/{full_repo_name}/git/trees/{default_branch}"
 
-        def get_visit_url(file_path: str):
-            return (
-                f"https://github.com/{full_repo_name}/blob/{default_branch}/{file_path}"
+        params = {"recursive": True}
+        file_dicts: list[FileDict] = []
+        response = await self.__get_json(endpoint, params)
+        for entity in response["body"]["tree"]:
+            if entity["type"] == "blob" and entity["size"] <= max_file_size:
+                if is_supported_file(entity["path"], supported_extensions):
+                    file_dicts.append(
+                        get_file_dict(
+                            full_repo_name,
+                            default_branch,
+                            entity["path"],
+                            entity["sha"],
+                        )
+                    )
+        return file_dicts
+
+    async def get_files_from_tarball(
+        self,
+        full_repo_name: str,
+        default_branch: str,
+        supported_extensions: set[str],
+        max_file_size: int = MAX_FILE_SIZE,
+        max_tarball_size: int = MAX_TARBALL_SIZE,
+    ):
+        # Downloads the repository once as a tarball instead of its tree and then each file separately.
+        # The contents of the supported files go straight into the blob cache's disk tier, so later downloads are
+        # served from it.
+        endpoint = f"{GITHUB_API_URL}/repos/{full_repo_name}/tarball/{default_branch}"
+        with SpooledTemporaryFile(max_size=TARBALL_SPOOL_SIZE) as tarball:
+            async with self.__stream(
+                "GET",
+                endpoint,
+                Priority.BACKGROUND,
+                headers=self.HEADERS,
+                follow_redirects=True,
+            ) as response:
+                if response.status_code != status.HTTP_200_OK:
+                    await response.aread()
+                    raise GithubApiException(
+                        response.request.url, response.status_code, response.text
+                    )
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > max_tarball_size:
+                        raise TarballTooLargeError(full_repo_name, max_tarball_size)
+                    tarball.write(chunk)
+            tarball.seek(0)
+            # each file is extracted in a worker thread and stored before the next one is read
+            extracted_files = extract_supported_files(
+                tarball, supported_extensions, max_file_size
             )
+            file_dicts: list[FileDict] = []
+            try:
+                while (
+                    extracted_file := await anyio.to_thread.run_sync(
+                        next, extracted_files, None
+                    )
+                ) is not None:
+                    if self.__blob_cache is not None:
+                        await self.__blob_cache.prefetch(
+                            extracted_file["sha"], extracted_file["content"]
+                        )
+                    file_dicts.append(
+                        get_file_dict(
+                            full_repo_name,
+                            default_branch,
+                            extracted_file["path"],
+                            extracted_file["sha"],
+                        )
+                    )
+            finally:
+                extracted_files.close()
+        return file_dicts
 
-        endpoint = (
-            f"https://api.github.com/repos/{full_repo_name}/git/trees/{default_branch}"
+    async def __query_graphql(self, query: str, variables: dict):
+        endpoint = f"{GITHUB_API_URL}/graphql"
+        response = await self.__send(
+            "POST",
+            endpoint,
+            Priority.BACKGROUND,
+            resource="graphql",
+            json={"query": query, "variables": variables},
+            headers=self.HEADERS,
         )
+        if response.status_code != status.HTTP_200_OK or not response.json().get(
+            "data"
+        ):
+            raise GithubApiException(
+                response.request.url, response.status_code, response.text
+            )
+        if "errors" in response.json():
+            # partial results, i.e. one of several queried repositories no longer exists
+            LOGGER.warning(f"Github GraphQL query returned errors: {response.text}")
+        return response.json()["data"]
 
-        params = {"recursive": True}
+    def __get_file_dicts_from_tree(
+        self,
+        full_repo_name: str,
+        default_branch: str,
+        tree: dict | None,
+        supported_extensions: set[str],
+        max_file_size: int,
+    ):
         file_dicts: list[FileDict] = []
-        async with AsyncClient() as client:
-            response = await client.get(endpoint, headers=self.HEADERS, params=params)
-            if response.status_code != status.HTTP_200_OK:
-                raise GithubApiException(
-                    response.request.url, response.status_code, response.text
-                )
-
-            for entity in response.json()["tree"]:
-                if entity["type"] == "blob" and entity["size"] <= max_file_size:
-                    extension = Path(entity["path"]).suffix[1:]
-                    if extension in supported_extensions:
-                        file_dicts.append(
-                            FileDict(
-                                path=entity["path"],
-                                download_url=get_download_url(entity["path"]),
-                                visit_url=get_visit_url(entity["path"]),
-                            )
+        for blob in get_tree_blobs(tree):
+            if blob["size"] <= max_file_size and not blob["is_binary"]:
+                if is_supported_file(blob["path"], supported_extensions):
+                    file_dicts.append(
+                        get_file_dict(
+                            full_repo_name, default_branch, blob["path"], blob["sha"]
                         )
+                    )
         return file_dicts
 
-    async def download_file_from_url(self, gh_download_url: str):
-        async with AsyncClient() as client:
-            response = await client.get(gh_download_url)
+    async def get_non_forked_repos_with_files(
+        self,
+        username: str,
+        supported_extensions: set[str],
+        max_file_size: int = MAX_FILE_SIZE,
+        min_repos: int = 100,
+        page_size: int = 25,
+    ):
+        # The GraphQL counterpart of get_non_forked_repos. Only the first page of repos comes with their shallow trees,
+        # the files of repos on later pages are None as they weren't fetched.
+        repos_with_files: list[tuple[RepositoryDict, list[FileDict] | None]] = []
+        cursor = None
+        with_tree = True
+        can_get_next_page = True
+        while len(repos_with_files) < min_repos and can_get_next_page:
+            variables = {
+                "username": username,
+                "first": page_size if with_tree else 100,
+                "after": cursor,
+                "withTree": with_tree,
+            }
+            data = await self.__query_graphql(REPOS_QUERY, variables)
+            repositories = data["user"]["repositories"]
+            for repo in repositories["nodes"]:
+                if (repo["diskUsage"] or 0) > 0 and repo[
+                    "defaultBranchRef"
+                ] is not None:
+                    repo_dict = RepositoryDict(
+                        name=repo["nameWithOwner"],
+                        last_pushed_at=datetime.fromisoformat(
+                            repo["pushedAt"].replace("Z", "+00:00")
+                        ),
+                        default_branch=repo["defaultBranchRef"]["name"],
+                    )
+                    file_dicts = None
+                    if with_tree:
+                        target = repo["defaultBranchRef"].get("target") or {}
+                        file_dicts = self.__get_file_dicts_from_tree(
+                            repo_dict["name"],
+                            repo_dict["default_branch"],
+                            target.get("tree"),
+                            supported_extensions,
+                            max_file_size,
+                        )
+                    repos_with_files.append((repo_dict, file_dicts))
+
+            can_get_next_page = repositories["pageInfo"]["hasNextPage"]
+            cursor = repositories["pageInfo"]["endCursor"]
+            with_tree = False
+
+        next_cursor = None
+        if can_get_next_page:
+            next_cursor = cursor
+        return repos_with_files, next_cursor
+
+    async def get_files_for_repos(
+        self,
+        repos: list[tuple[str, str]],
+        supported_extensions: set[str],
+        max_file_size: int = MAX_FILE_SIZE,
+    ):
+        # The GraphQL counterpart of get_files_for_repo, fetching the shallow trees of the given
+        # (full repo name, default branch) pairs in a single query. Files are returned in the order of the repos.
+        if len(repos) == 0:
+            return []
+        variables = {}
+        for i, (full_repo_name, _) in enumerate(repos):
+            owner, name = full_repo_name.split("/", 1)
+            variables[f"owner{i}"] = owner
+            variables[f"name{i}"] = name
+        data = await self.__query_graphql(get_repo_trees_query(len(repos)), variables)
+
+        repo_file_dicts: list[list[FileDict]] = []
+        for i, (full_repo_name, default_branch) in enumerate(repos):
+            repo = data.get(f"r{i}") or {}
+            target = (repo.get("defaultBranchRef") or {}).get("target") or {}
+            repo_file_dicts.append(
+                self.__get_file_dicts_from_tree(
+                    full_repo_name,
+                    default_branch,
+                    target.get("tree"),
+                    supported_extensions,
+                    max_file_size,
+                )
+            )
+        return repo_file_dicts
+
+    async def download_file_from_url(
+        self,
+        gh_download_url: str,
+        sha: str | None = None,
+        priority: Priority = Priority.CRITICAL,
+        max_file_size: int = MAX_FILE_SIZE,
+    ):
+        if sha is not None and self.__blob_cache is not None:
+            content = await self.__blob_cache.get(sha)
+            if content is not None:
+                return content
+
+        return await self.__coalesce(
+            f"GET {gh_download_url} {max_file_size}",
+            self.__download,
+            gh_download_url,
+            sha,
+            priority,
+            max_file_size,
+        )
+
+    async def __download(
+        self,
+        gh_download_url: str,
+        sha: str | None,
+        priority: Priority,
+        max_file_size: int,
+    ):
+        # The tree's size metadata can't be trusted to bound the download (LFS pointers, redirects, stale trees),
+        # so the content is streamed and the download is aborted as soon as it turns out to be unsupported.
+        # Raw content isn't subject to the API's rate limit, so it is scheduled under its own resource.
+        async with self.__stream(
+            "GET", gh_download_url, priority, resource="raw"
+        ) as response:
             if response.status_code != status.HTTP_200_OK:
+                await response.aread()
                 raise GithubApiException(
                     response.request.url, response.status_code, response.text
                 )
-            return response.text
+            # decoded as response.text would, replacing the bytes that aren't valid in the response's encoding
+            decoder = codecs.getincrementaldecoder(response.encoding)(errors="replace")
+            chunks: list[str] = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                if size == 0 and chunk.startswith(LFS_POINTER_PREFIX):
+                    reason = UnsupportedFileError.Reason.LFS_POINTER
+                    break
+                size += len(chunk)
+                if size > max_file_size:
+                    reason = UnsupportedFileError.Reason.TOO_LARGE
+                    break
+                if b"\0" in chunk:
+                    reason = UnsupportedFileError.Reason.BINARY
+                    break
+                chunks.append(decoder.decode(chunk))
+            else:
+                chunks.append(decoder.decode(b"", final=True))
+                reason = None
+
+        if reason is not None:
+            GITHUB_UNSUPPORTED_DOWNLOADS.labels(reason.value).inc()
+            raise UnsupportedFileError(gh_download_url, reason)
+        content = "".join(chunks)
+        if sha is not None and self.__blob_cache is not None:
+            await self.__blob_cache.put(sha, content)
+        return content
 
     async def create_issue(self, title: str, body: str, labels: list[str]):
-        endpoint = "https://api.github.com/repos/rohanshiva/gitgame/issues"
+        endpoint = f"{GITHUB_API_URL}/repos/rohanshiva/gitgame/issues"
         payload = {"title": title, "body": body, "labels": labels}
-        async with AsyncClient() as client:
-            response = await client.post(endpoint, json=payload, headers=self.HEADERS)
-            if response.status_code != status.HTTP_201_CREATED:
-                raise GithubApiException(
-                    response.request.url, response.status_code, response.text
-                )
+        response = await self.__send(
+            "POST", endpoint, Priority.INTERACTIVE, json=payload, headers=self.HEADERS
+        )
+        if response.status_code != status.HTTP_201_CREATED:
+            raise GithubApiException(
+                response.request.url, response.status_code, response.text
+            )
 
     async def get_user(self):
-        endpoint = "https://api.github.com/user"
-        async with AsyncClient() as client:
-            response = await client.get(endpoint, headers=self.HEADERS)
-            if response.status_code != status.HTTP_200_OK:
-                raise GithubApiException(
-                    response.request.url, response.status_code, response.text
-                )
-            user = response.json()
-            return UserDict(
-                username=user["login"], name=user["name"], node_id=user["node_id"]
+        endpoint = f"{GITHUB_API_URL}/user"
+        response = await self.__send(
+            "GET", endpoint, Priority.INTERACTIVE, headers=self.HEADERS
+        )
+        if response.status_code != status.HTTP_200_OK:
+            raise GithubApiException(
+                response.request.url, response.status_code, response.text
             )
+        user = response.json()
+        return UserDict(
+            username=user["login"], name=user["name"], node_id=user["node_id"]
+        )
@@ -0,0 +1,116 @@
+"""
+Queries for the Github GraphQL API, which can fetch the metadata and the (shallow) trees of many repositories
+in a single request, whereas the REST API needs a request per page of repositories and another per tree.
+Trees are fetched two levels deep: the root entries of a repository and the entries of its top-level directories.
+"""
+
+TREE_FRAGMENT = """
+fragment TreeEntries on Tree {
+  entries {
+    path
+    type
+    oid
+    object {
+      ... on Blob {
+        byteSize
+        isBinary
+      }
+      ... on Tree {
+        entries {
+          path
+          type
+          oid
+          object {
+            ... on Blob {
+              byteSize
+              isBinary
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+REPOS_QUERY = (
+    """
+query($username: String!, $first: Int!, $after: String, $withTree: Boolean!) {
+  user(login: $username) {
+    repositories(
+      first: $first
+      after: $after
+      ownerAffiliations: OWNER
+      isFork: false
+      orderBy: {field: PUSHED_AT, direction: ASC}
+    ) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      nodes {
+        nameWithOwner
+        pushedAt
+        diskUsage
+        defaultBranchRef {
+          name
+          target @include(if: $withTree) {
+            ... on Commit {
+              tree {
+                ...TreeEntries
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+    + TREE_FRAGMENT
+)
+
+
+def get_repo_trees_query(repo_count: int):
+    # a repository field per repo, aliased as r0, r1, ...
+    variables = ", ".join(
+        [f"$owner{i}: String!, $name{i}: String!" for i in range(repo_count)]
+    )
+    fields = "\n".join(
+        [
+            f"""
+  r{i}: repository(owner: $owner{i}, name: $name{i}) {{
+    defaultBranchRef {{
+      target {{
+        ... on Commit {{
+          tree {{
+            ...TreeEntries
+          }}
+        }}
+      }}
+    }}
+  }}"""
+            for i in range(repo_count)
+        ]
+    )
+    return f"query({variables}) {{{fields}\n}}\n" + TREE_FRAGMENT
+
+
+def get_tree_blobs(tree: dict | None):
+    blobs = []
+    if tree is None:
+        return blobs
+    for entry in tree["entries"]:
+        entry_object = entry.get("object") or {}
+        if entry["type"] == "blob":
+            blobs.append(
+                {
+                    "path": entry["path"],
+                    "sha": entry["oid"],
+                    "size": entry_object.get("byteSize") or 0,
+                    "is_binary": bool(entry_object.get("isBinary")),
+                }
+            )
+        elif entry["type"] == "tree" and "entries" in entry_object:
+            blobs.extend(get_tree_blobs(entry_object))
+    return blobs
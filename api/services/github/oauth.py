@@ -2,6 +2,7 @@ from typing import TypedDict
 from httpx import AsyncClient
 from fastapi import status
 from urllib.parse import urlencode
+from config import GITHUB_URL
 from .client import GithubApiException
 
 
@@ -31,31 +32,31 @@ class GithubOauthStore:
 
 
 class GithubOauth:
-    def __init__(self, id: str, secret: str):
+    def __init__(self, id: str, secret: str, http_client: AsyncClient):
         self.__client_id = id
         self.__client_secret = secret
+        self.__http_client = http_client
         self.store = GithubOauthStore()
 
     async def get_access_token(self, code: str) -> str:
-        endpoint = f"https://github.com/login/oauth/access_token"
-        async with AsyncClient() as client:
-            payload = {
-                "client_id": self.__client_id,
-                "client_secret": self.__client_secret,
-                "code": code,
-            }
-            response = await client.post(
-                endpoint,
-                json=payload,
-                headers={"Accept": "application/json"},
+        endpoint = f"{GITHUB_URL}/login/oauth/access_token"
+        payload = {
+            "client_id": self.__client_id,
+            "client_secret": self.__client_secret,
+            "code": code,
+        }
+        response = await self.__http_client.post(
+            endpoint,
+            json=payload,
+            headers={"Accept": "application/json"},
+        )
+        if response.status_code != status.HTTP_200_OK or "error" in response.json():
+            raise GithubApiException(
+                response.request.url, response.status_code, response.text
             )
-            if response.status_code != status.HTTP_200_OK or "error" in response.json():
-                raise GithubApiException(
-                    response.request.url, response.status_code, response.text
-                )
-            return response.json()["access_token"]
+        return response.json()["access_token"]
 
     def get_authorization_url(self, state: str):
-        endpoint = "https://github.com/login/oauth/authorize"
+        endpoint = f"{GITHUB_URL}/login/oauth/authorize"
         params = {"state": state, "client_id": self.__client_id}
         return f"{endpoint}?{urlencode(params)}"
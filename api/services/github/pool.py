@@ -0,0 +1,62 @@
+from typing import TypedDict
+from httpx import AsyncClient, AsyncHTTPTransport, Limits, Timeout
+
+
+class PoolStats(TypedDict):
+    active: int
+    idle: int
+    waiting: int
+
+
+"""
+A single keep-alive (and HTTP/2 capable) connection pool shared by every Github call the app makes.
+It is opened in the startup hook of main.py and closed on shutdown.
+"""
+
+
+class GithubConnectionPool:
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        connect_timeout: float,
+        read_timeout: float,
+        acquire_timeout: float,
+        http2: bool = True,
+    ):
+        # the transport is kept to read its pool's stats, AsyncClient only holds it privately
+        self.__transport = AsyncHTTPTransport(
+            http2=http2,
+            limits=Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.client = AsyncClient(
+            transport=self.__transport,
+            timeout=Timeout(
+                read_timeout,
+                connect=connect_timeout,
+                pool=acquire_timeout,
+            ),
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    def get_stats(self) -> PoolStats:
+        # Neither httpx nor httpcore expose pool stats publicly, so we peek at the httpcore pool (pinned in
+        # requirements.txt). The stats read as 0 rather than break should an upgrade move them.
+        pool = getattr(self.__transport, "_pool", None)
+        connections = getattr(pool, "connections", [])
+        idle = len([connection for connection in connections if connection.is_idle()])
+        waiting = len(
+            [
+                request
+                for request in getattr(pool, "_requests", [])
+                if getattr(request, "connection", None) is None
+            ]
+        )
+        return PoolStats(active=len(connections) - idle, idle=idle, waiting=waiting)
@@ -0,0 +1,116 @@
+import anyio
+import logging
+import time
+from enum import IntEnum
+from itertools import count
+from typing import Mapping
+from metrics import GITHUB_RATE_LIMIT_REMAINING, GITHUB_SCHEDULER_QUEUE_DEPTH
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    CRITICAL = 0  # blocks a round, i.e. downloading the next file during an advance
+    INTERACTIVE = 1  # a user is waiting on it, but no round is
+    BACKGROUND = 2  # listing repos and trees to build file pools
+
+
+class RateLimitWindow:
+    def __init__(self):
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.reset: float | None = None  # epoch seconds
+
+    def roll_over(self, now: float):
+        if self.reset is not None and now >= self.reset:
+            self.remaining = self.limit
+            self.reset = None
+
+
+"""
+Every request to the Github API made with the app's access token is admitted through this scheduler.
+The remaining quota of each rate limit resource (core, graphql, ...) is tracked from the X-RateLimit-* headers of the responses.
+Each priority has a reserve of quota it may not dip into, so when the quota runs low, background work queues up until the
+window resets (or for at most max_wait seconds) while critical-path requests keep flowing. Requests are admitted in priority order.
+"""
+
+
+class GithubRequestScheduler:
+    def __init__(self, reserves: Mapping[Priority, int], max_wait: float):
+        self.__reserves = reserves
+        self.__max_wait = max_wait
+        self.__windows: dict[str, RateLimitWindow] = {}
+        self.__waiting: list[tuple[Priority, int, str]] = []
+        self.__tickets = count()
+        self.__changed: anyio.Event | None = None
+
+    def get_remaining(self, resource: str = "core") -> int | None:
+        return self.__get_window(resource).remaining
+
+    def __get_window(self, resource: str):
+        if resource not in self.__windows:
+            self.__windows[resource] = RateLimitWindow()
+        window = self.__windows[resource]
+        window.roll_over(time.time())
+        return window
+
+    def __notify(self):
+        if self.__changed is not None:
+            self.__changed.set()
+            self.__changed = None
+
+    def __is_next(self, ticket: tuple[Priority, int, str]):
+        # the highest priority (and then oldest) request waiting on the same resource goes first
+        return ticket == min(
+            [waiting for waiting in self.__waiting if waiting[2] == ticket[2]]
+        )
+
+    def __can_admit(self, window: RateLimitWindow, priority: Priority):
+        return window.remaining is None or window.remaining > self.__reserves[priority]
+
+    def __get_wait_timeout(self, window: RateLimitWindow, deadline: float):
+        timeout = deadline - time.monotonic()
+        if window.reset is not None:
+            timeout = min(timeout, window.reset - time.time())
+        return max(timeout, 0)
+
+    async def acquire(self, priority: Priority, resource: str = "core"):
+        ticket = (priority, next(self.__tickets), resource)
+        self.__waiting.append(ticket)
+        GITHUB_SCHEDULER_QUEUE_DEPTH.labels(priority.name.lower()).inc()
+        deadline = time.monotonic() + self.__max_wait
+        try:
+            while True:
+                window = self.__get_window(resource)
+                if self.__is_next(ticket) and self.__can_admit(window, priority):
+                    break
+                if time.monotonic() >= deadline:
+                    LOGGER.warning(
+                        f"Sending {priority.name} Github request after waiting {self.__max_wait}s on the '{resource}' rate limit"
+                    )
+                    break
+                if self.__changed is None:
+                    self.__changed = anyio.Event()
+                changed = self.__changed
+                with anyio.move_on_after(self.__get_wait_timeout(window, deadline)):
+                    await changed.wait()
+        finally:
+            self.__waiting.remove(ticket)
+            GITHUB_SCHEDULER_QUEUE_DEPTH.labels(priority.name.lower()).dec()
+            self.__notify()
+
+        if window.remaining is not None:
+            # optimistically spend the quota until the response's headers tell us otherwise
+            window.remaining = max(window.remaining - 1, 0)
+
+    def observe(self, headers: Mapping[str, str]):
+        if "x-ratelimit-remaining" not in headers:
+            return
+        resource = headers.get("x-ratelimit-resource", "core")
+        window = self.__get_window(resource)
+        window.remaining = int(headers["x-ratelimit-remaining"])
+        window.limit = int(headers.get("x-ratelimit-limit", window.remaining))
+        if "x-ratelimit-reset" in headers:
+            window.reset = float(headers["x-ratelimit-reset"])
+        GITHUB_RATE_LIMIT_REMAINING.labels(resource).set(window.remaining)
+        self.__notify()
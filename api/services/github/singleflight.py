@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+from metrics import GITHUB_SINGLE_FLIGHT_REQUESTS
+
+"""
+Coalesces identical Github calls that are in flight at the same time, i.e. the repo lists, trees and files fetched
+when a user joins several sessions at once or a session's players all trigger loads together.
+The first caller for a key (a miss) starts the call, and concurrent callers with the same key (hits) await it too,
+getting the same result or exception. Results aren't kept once the call completes; that is the caches' job.
+"""
+
+
+class SingleFlight:
+    def __init__(self):
+        self.__calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[..., Awaitable[Any]], *args):
+        call = self.__calls.get(key)
+        if call is None:
+            GITHUB_SINGLE_FLIGHT_REQUESTS.labels("miss").inc()
+            call = asyncio.create_task(func(*args))
+            self.__calls[key] = call
+            call.add_done_callback(lambda _: self.__forget(key, call))
+        else:
+            GITHUB_SINGLE_FLIGHT_REQUESTS.labels("hit").inc()
+        # shielded, so that a cancelled caller doesn't cancel the call for everyone else awaiting it
+        return await asyncio.shield(call)
+
+    def __forget(self, key: str, call: asyncio.Task):
+        if self.__calls.get(key) is call:
+            del self.__calls[key]
+        # the exception is still raised to every awaiting caller, this only silences the warning when there are none
+        if not call.cancelled():
+            call.exception()
@@ -0,0 +1,39 @@
+import hashlib
+import tarfile
+from pathlib import PurePosixPath
+from typing import IO, Iterator, TypedDict
+
+
+class ExtractedFile(TypedDict):
+    path: str
+    sha: str
+    content: str
+
+
+def get_blob_sha(data: bytes):
+    # the same sha git (and thus the trees API) gives the blob, so extracted files share cache entries with downloaded ones
+    header = f"blob {len(data)}\0".encode()
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def extract_supported_files(
+    fileobj: IO[bytes], supported_extensions: set[str], max_file_size: int
+) -> Iterator[ExtractedFile]:
+    # Reads a gzipped repository tarball as a stream, yielding the supported text files no larger than max_file_size
+    # one at a time, so that a repo's files are never all held in memory at once
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tarball:
+        for member in tarball:
+            if not member.isfile() or member.size > max_file_size:
+                continue
+            # Github prefixes every path with a '<owner>-<repo>-<commit>/' directory
+            path = PurePosixPath(*PurePosixPath(member.name).parts[1:])
+            if path.suffix[1:] not in supported_extensions:
+                continue
+            data = tarball.extractfile(member).read()
+            if b"\0" in data:
+                continue
+            try:
+                content = data.decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            yield ExtractedFile(path=str(path), sha=get_blob_sha(data), content=content)
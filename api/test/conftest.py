@@ -1,20 +1,47 @@
+import hashlib
+import logging
 import pytest
+from contextlib import contextmanager
 from httpx import AsyncClient
 from tortoise import Tortoise
 from config import TEST_DB_URI
 from main import app
 from typing import Callable
-from models import Session, Player, Repository, File, SourceCode
+from db.engine import get_tortoise_config
+from db.models import (
+    Session,
+    Player,
+    Author,
+    Repository,
+    File,
+    PoolFile,
+    SourceCode,
+    StagedCode,
+    Comment,
+    GithubResponse,
+)
 from unittest.mock import patch, Mock, AsyncMock
 from services.github.client import (
     GithubClient,
     RepositoryDict,
     FileDict,
 )
-from datetime import datetime
+from datetime import datetime, timezone
 from nanoid import generate
 
-MODELS = [Session, Player, Repository, File, SourceCode]
+# in an order that deletes rows before the rows they reference
+MODELS = [
+    Comment,
+    SourceCode,
+    StagedCode,
+    PoolFile,
+    Player,
+    Session,
+    File,
+    Repository,
+    Author,
+    GithubResponse,
+]
 
 
 @pytest.fixture
@@ -29,9 +56,7 @@ def anyio_backend():
 
 @pytest.fixture(scope="session", autouse=True)
 async def init_test_db():
-    await Tortoise.init(
-        db_url=TEST_DB_URI, modules={"models": ["models"]}, _create_db=True
-    )
+    await Tortoise.init(config=get_tortoise_config(TEST_DB_URI), _create_db=True)
     await Tortoise.generate_schemas()
     yield
     await Tortoise._drop_databases()
@@ -64,12 +89,8 @@ def get_test_repos(user: str, limit: int = 1):
         repos.append(
             RepositoryDict(
                 name=f"{user}/Repo-{i}",
-                pushed_at=datetime.now().isoformat(),
-                url=f"https://github.com/{user}/Repo-{i}",
-                stars=0,
+                last_pushed_at=datetime.now(timezone.utc),
                 default_branch="main",
-                description="Description for Repo-{i}",
-                language="python",
             )
         )
     return repos
@@ -82,10 +103,11 @@ def get_test_files(repo: str, limit: int = 1):
         path = f"src/{file_name}"
         files.append(
             FileDict(
-                name=file_name,
                 path=path,
                 download_url=f"https://raw.githubusercontent.com/{path}",
                 visit_url=f"https://github.com/{path}",
+                # a fake git blob sha, unique to the file
+                sha=hashlib.sha1(path.encode()).hexdigest(),
             )
         )
     return files
@@ -142,3 +164,31 @@ async def clear_db():
     yield
     for model in MODELS:
         await model.all().delete()
+
+
+class QueryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        self.count += 1
+
+
+@pytest.fixture
+def count_queries():
+    # Tortoise's asyncpg client logs every query it runs at debug level
+    @contextmanager
+    def counter():
+        db_logger = logging.getLogger("tortoise.db_client")
+        handler = QueryCounter()
+        level = db_logger.level
+        db_logger.addHandler(handler)
+        db_logger.setLevel(logging.DEBUG)
+        try:
+            yield handler
+        finally:
+            db_logger.removeHandler(handler)
+            db_logger.setLevel(level)
+
+    return counter
@@ -0,0 +1,25 @@
+import pytest
+from datetime import timedelta
+from tortoise import timezone
+from db import Caches, Models
+from services.github.cache import CachedResponse
+
+
+def get_test_response(body):
+    return CachedResponse(etag='"abc"', last_modified=None, link=None, body=body)
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestPostgresResponseCache:
+    @pytest.mark.anyio
+    async def test_old_responses_are_pruned(self):
+        cache = Caches.PostgresResponseCache(max_age=60)
+        await cache.put("/users/octocat/repos", get_test_response([]))
+        await Models.GithubResponse.filter(key="/users/octocat/repos").update(
+            updated_at=timezone.now() - timedelta(seconds=120)
+        )
+        await cache.put("/users/hubot/repos", get_test_response([]))
+        await cache.prune()
+
+        assert await cache.get("/users/octocat/repos") is None
+        assert await cache.get("/users/hubot/repos") is not None
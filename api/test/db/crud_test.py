@@ -0,0 +1,233 @@
+import anyio
+import pytest
+from nanoid import generate
+from db import Models
+from db import crud as Crud
+from services import GithubApiException
+from test.conftest import mock_gh_client, get_test_repos, get_test_files
+
+
+@pytest.fixture
+def slow_gh_client():
+    def user_to_repos(username: str, *args, **kwargs):
+        return (get_test_repos(username, limit=2), None)
+
+    def repo_to_files(repo: str, *args, **kwargs):
+        return get_test_files(repo, limit=5)
+
+    async def file_from_url(url: str, *args):
+        # the downloads of staging and advancing finish in the same tick
+        await anyio.sleep(0.01)
+        return f"print('{url}')"
+
+    return mock_gh_client(user_to_repos, repo_to_files, file_from_url)
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestStageNextCode:
+    @pytest.mark.anyio
+    async def test_staging_while_advancing(self, slow_gh_client):
+        for _ in range(5):
+            session = await Models.Session.create(id=generate(size=10))
+            await Crud.join(session.id, "octocat")
+            await Crud.load_player_files(session.id, "octocat", slow_gh_client)
+
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(Crud.stage_next_code, session.id, slow_gh_client)
+                tg.start_soon(Crud.advance, session.id, slow_gh_client)
+
+            source_code = await Models.SourceCode.get(session_id=session.id)
+            staged_code = await Models.StagedCode.get_or_none(session_id=session.id)
+            if staged_code is not None:
+                assert staged_code.file_id != source_code.file_id
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestAdvance:
+    @pytest.mark.anyio
+    async def test_files_deleted_upstream_are_skipped(self, session: Models.Session):
+        missing_urls = []
+
+        def user_to_repos(username: str, *args, **kwargs):
+            return (get_test_repos(username, limit=1), None)
+
+        def repo_to_files(repo: str, *args, **kwargs):
+            return get_test_files(repo, limit=3)
+
+        def file_from_url(url: str, *args):
+            # the first file picked was deleted from its repo since the repo was listed
+            if len(missing_urls) == 0:
+                missing_urls.append(url)
+            if url in missing_urls:
+                raise GithubApiException(url, 404, "Not Found")
+            return f"print('{url}')"
+
+        gh_client = mock_gh_client(user_to_repos, repo_to_files, file_from_url)
+        await Crud.join(session.id, "octocat")
+        await Crud.load_player_files(session.id, "octocat", gh_client)
+
+        updated_session = await Crud.advance(session.id, gh_client)
+
+        assert not updated_session.is_terminated
+        source_code = await Models.SourceCode.get(
+            session_id=session.id
+        ).prefetch_related("file")
+        assert source_code.file.download_url != missing_urls[0]
+        missing_file = await Models.File.get(download_url=missing_urls[0])
+        assert not missing_file.is_playable
+
+    @pytest.mark.anyio
+    async def test_skipped_files_stay_for_other_sessions(self):
+        def user_to_repos(username: str, *args, **kwargs):
+            return (get_test_repos(username, limit=1), None)
+
+        def repo_to_files(repo: str, *args, **kwargs):
+            return get_test_files(repo, limit=3)
+
+        gh_client = mock_gh_client(
+            user_to_repos, repo_to_files, lambda url, *args: f"print('{url}')"
+        )
+        sessions = [await Models.Session.create(id=generate(size=10)) for _ in range(2)]
+        for session in sessions:
+            await Crud.join(session.id, "octocat")
+            await Crud.load_player_files(session.id, "octocat", gh_client)
+        await Crud.advance(sessions[0].id, gh_client)
+        shown_code = await Models.SourceCode.get(
+            session_id=sessions[0].id
+        ).prefetch_related("file")
+
+        def file_from_url(url: str, *args):
+            # the file shown in the first session was deleted from its repo since
+            if url == shown_code.file.download_url:
+                raise GithubApiException(url, 404, "Not Found")
+            return f"print('{url}')"
+
+        gh_client = mock_gh_client(user_to_repos, repo_to_files, file_from_url)
+        await Models.PoolFile.filter(
+            session_id=sessions[1].id, file_id=shown_code.file.id
+        ).update(position=-1)
+        await Crud.advance(sessions[1].id, gh_client)
+
+        source_code = await Models.SourceCode.get(session_id=sessions[1].id)
+        assert source_code.file_id != shown_code.file.id
+        assert await Models.SourceCode.exists(id=shown_code.id)
+        assert await Models.PoolFile.filter(file_id=shown_code.file.id).count() == 2
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestLoadPlayerFiles:
+    @pytest.mark.anyio
+    async def test_failed_listings_are_not_retried_right_away(self):
+        listed_repos = []
+
+        def user_to_repos(username: str, *args, **kwargs):
+            return (get_test_repos(username, limit=2), None)
+
+        def repo_to_files(repo: str, *args, **kwargs):
+            listed_repos.append(repo)
+            if repo.endswith("-0"):
+                raise GithubApiException(repo, 502, "Bad Gateway")
+            if repo.endswith("-1"):
+                raise GithubApiException(repo, 409, "Git Repository is empty.")
+            return get_test_files(repo, limit=3)
+
+        gh_client = mock_gh_client(
+            user_to_repos, repo_to_files, lambda url, *args: f"print('{url}')"
+        )
+        for _ in range(2):
+            session = await Models.Session.create(id=generate(size=10))
+            await Crud.join(session.id, "octocat")
+            await Crud.load_player_files(session.id, "octocat", gh_client)
+
+        assert len(listed_repos) == 2
+        failed_repo = await Models.Repository.get(name__endswith="-0")
+        assert failed_repo.files_failed_at is not None
+        assert not failed_repo.are_files_fresh
+        empty_repo = await Models.Repository.get(name__endswith="-1")
+        assert empty_repo.are_files_fresh
+
+    @pytest.mark.anyio
+    async def test_repos_missing_from_listing_are_pruned(self):
+        listed_repos = get_test_repos("octocat", limit=3)
+
+        def user_to_repos(username: str, *args, **kwargs):
+            return (listed_repos, None)
+
+        def repo_to_files(repo: str, *args, **kwargs):
+            return get_test_files(repo, limit=1)
+
+        gh_client = mock_gh_client(
+            user_to_repos, repo_to_files, lambda url, *args: f"print('{url}')"
+        )
+        session = await Models.Session.create(id=generate(size=10))
+        await Crud.join(session.id, "octocat")
+        await Crud.load_player_files(session.id, "octocat", gh_client)
+        await Crud.advance(session.id, gh_client)
+        shown_code = await Models.SourceCode.get(
+            session_id=session.id
+        ).prefetch_related("file__repo")
+
+        # every repo was deleted since, but the one of the code being shown stays
+        listed_repos = []
+        await Models.Author.filter(username="octocat").update(repos_refreshed_at=None)
+        other_session = await Models.Session.create(id=generate(size=10))
+        await Crud.join(other_session.id, "octocat")
+        await Crud.load_player_files(other_session.id, "octocat", gh_client)
+
+        repo_names = await Models.Repository.all().values_list("name", flat=True)
+        assert repo_names == [shown_code.file.repo.name]
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestPool:
+    @pytest.mark.anyio
+    async def test_players_files_alternate(self, session: Models.Session):
+        def user_to_repos(username: str, *args, **kwargs):
+            return (get_test_repos(username, limit=1), None)
+
+        def repo_to_files(repo: str, *args, **kwargs):
+            return get_test_files(repo, limit=3)
+
+        gh_client = mock_gh_client(
+            user_to_repos, repo_to_files, lambda url, *args: f"print('{url}')"
+        )
+        for player_name in ["octocat", "hubot"]:
+            await Crud.join(session.id, player_name)
+            await Crud.load_player_files(session.id, player_name, gh_client)
+
+        pool = await Models.PoolFile.filter(session_id=session.id).order_by("position")
+        # every slot holds one file of each player
+        for slot in range(3):
+            slot_pool = [
+                pool_file for pool_file in pool if int(pool_file.position) == slot
+            ]
+            assert len({pool_file.player_id for pool_file in slot_pool}) == 2
+
+        # files are played in the order of position
+        for pool_file in pool:
+            await Crud.advance(session.id, gh_client)
+            source_code = await Models.SourceCode.get(session_id=session.id)
+            assert source_code.file_id == pool_file.file_id
+
+    @pytest.mark.anyio
+    async def test_concurrent_loads_draw_files_once(self, session: Models.Session):
+        def user_to_repos(username: str, *args, **kwargs):
+            return (get_test_repos(username, limit=2), None)
+
+        async def repo_to_files(repo: str, *args, **kwargs):
+            await anyio.sleep(0.01)
+            return get_test_files(repo, limit=3)
+
+        gh_client = mock_gh_client(
+            user_to_repos, repo_to_files, lambda url, *args: f"print('{url}')"
+        )
+        await Crud.join(session.id, "octocat")
+        async with anyio.create_task_group() as tg:
+            for _ in range(2):
+                tg.start_soon(Crud.load_player_files, session.id, "octocat", gh_client)
+
+        assert await Models.PoolFile.filter(session_id=session.id).count() == 6
+        file_ids = await Models.PoolFile.filter(session_id=session.id).values_list(
+            "file_id", flat=True
+        )
+        assert len(set(file_ids)) == 6
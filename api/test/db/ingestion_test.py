@@ -0,0 +1,52 @@
+import pytest
+from datetime import datetime, timezone
+from tortoise.transactions import in_transaction
+from db import Models
+from db.ingestion import copy_upsert
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestCopyUpsert:
+    @pytest.mark.anyio
+    async def test_batches_inside_transaction(self):
+        async with in_transaction():
+            for prefix in ["octocat", "hubot"]:
+                count = await copy_upsert(
+                    Models.Author,
+                    ["username"],
+                    ((f"{prefix}-{i}",) for i in range(5)),
+                    conflict_columns=["username"],
+                    batch_size=2,
+                )
+                assert count == 5
+        assert await Models.Author.all().count() == 10
+
+    @pytest.mark.anyio
+    async def test_conflicting_rows_are_updated(self):
+        await Models.Author.create(username="octocat")
+        pushed_at = datetime.now(timezone.utc)
+        await copy_upsert(
+            Models.Repository,
+            ["id", "name", "default_branch", "last_pushed_at", "author_id"],
+            [
+                (
+                    "0c5e5a3a-6a5b-4f4b-9c39-3f6e2a7f9a01",
+                    "octocat/Hello-World",
+                    "master",
+                    pushed_at,
+                    "octocat",
+                ),
+                (
+                    "0c5e5a3a-6a5b-4f4b-9c39-3f6e2a7f9a02",
+                    "octocat/Hello-World",
+                    "main",
+                    pushed_at,
+                    "octocat",
+                ),
+            ],
+            conflict_columns=["name"],
+            update_columns=["default_branch"],
+            batch_size=1,
+        )
+        repo = await Models.Repository.get(name="octocat/Hello-World")
+        assert repo.default_branch == "main"
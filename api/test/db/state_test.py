@@ -0,0 +1,95 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from db import Models, State
+from db import crud as Crud
+
+
+@pytest.fixture
+async def session_with_code(session: Models.Session):
+    author = await Models.Author.create(username="octocat")
+    repo = await Models.Repository.create(
+        name="octocat/Hello-World",
+        default_branch="main",
+        last_pushed_at=datetime.now(timezone.utc),
+        author=author,
+    )
+    file = await Models.File.create(
+        path="main.py",
+        download_url="https://raw.githubusercontent.com/octocat/Hello-World/main/main.py",
+        visit_url="https://github.com/octocat/Hello-World/blob/main/main.py",
+        repo=repo,
+        author=author,
+    )
+    await Models.SourceCode.create(content="print('hello')", file=file, session=session)
+    await Crud.join(session.id, "octocat")
+    return session
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestFlush:
+    @pytest.mark.anyio
+    async def test_failed_writes_are_retried(self, session_with_code: Models.Session):
+        session_states = State.SessionStateStore(60, 300)
+        state = await session_states.get(session_with_code.id)
+        session_states.ready_up(state, "octocat")
+        session_states.add_comment(
+            state, "nice", 1, 2, Models.Comment.Type.DIAMOND, "octocat"
+        )
+
+        with patch.object(
+            Models.Comment, "bulk_create", side_effect=ConnectionError("gone")
+        ):
+            await session_states.flush(session_with_code.id)
+        assert len(state.pending_comments) == 1
+        assert await Models.Comment.all().count() == 0
+        # the readiness was written regardless
+        assert state.pending_readiness == {}
+
+        await session_states.flush(session_with_code.id)
+        assert not state.has_pending_writes
+        assert await Models.Comment.filter(content="nice").count() == 1
+        player = await Models.Player.get(
+            session_id=session_with_code.id, username="octocat"
+        )
+        assert player.is_ready
+
+    @pytest.mark.anyio
+    async def test_comments_that_cant_be_written_are_dropped(
+        self, session_with_code: Models.Session
+    ):
+        session_states = State.SessionStateStore(60, 300)
+        state = await session_states.get(session_with_code.id)
+        session_states.add_comment(
+            state, "nice", 1, 2, Models.Comment.Type.DIAMOND, "octocat"
+        )
+        # the code was deleted before the comment got written
+        await Models.SourceCode.filter(session_id=session_with_code.id).delete()
+        session_states.add_comment(
+            state, "still nice", 1, 2, Models.Comment.Type.DIAMOND, "octocat"
+        )
+        await session_states.flush(session_with_code.id)
+
+        assert not state.has_pending_writes
+        assert await Models.Comment.all().count() == 0
+
+    @pytest.mark.anyio
+    async def test_comments_written_by_a_failed_flush_arent_duplicated(
+        self, session_with_code: Models.Session
+    ):
+        session_states = State.SessionStateStore(60, 300)
+        state = await session_states.get(session_with_code.id)
+        session_states.add_comment(
+            state, "nice", 1, 2, Models.Comment.Type.DIAMOND, "octocat"
+        )
+        await session_states.flush(session_with_code.id)
+        # a flush wrote the comment but failed to tell, so it's retried
+        state.pending_comments = list(await Models.Comment.filter(content="nice").all())
+        session_states.add_comment(
+            state, "also nice", 1, 2, Models.Comment.Type.POOP, "octocat"
+        )
+        await session_states.flush(session_with_code.id)
+
+        assert not state.has_pending_writes
+        assert await Models.Comment.filter(content="nice").count() == 1
+        assert await Models.Comment.filter(content="also nice").count() == 1
@@ -0,0 +1,75 @@
+import pytest
+from datetime import datetime, timezone
+from db import Models, Views
+
+
+@pytest.fixture
+async def session_with_comments(session: Models.Session):
+    author = await Models.Author.create(username="octocat")
+    repo = await Models.Repository.create(
+        name="octocat/Hello-World",
+        default_branch="main",
+        last_pushed_at=datetime.now(timezone.utc),
+        author=author,
+    )
+    file = await Models.File.create(
+        path="src/app/main.py",
+        download_url="https://raw.githubusercontent.com/octocat/Hello-World/main/src/app/main.py",
+        visit_url="https://github.com/octocat/Hello-World/blob/main/src/app/main.py",
+        repo=repo,
+        author=author,
+    )
+    source_code = await Models.SourceCode.create(
+        content="print('hello')", file=file, session=session
+    )
+    players = [
+        await Models.Player.create(username=username, session=session)
+        for username in ["octocat", "hubot", "monalisa"]
+    ]
+    for i in range(6):
+        await Models.Comment.create(
+            content=f"comment {i}",
+            type=Models.Comment.Type.DIAMOND,
+            line_start=i,
+            line_end=i + 1,
+            author=players[i % len(players)],
+            source_code=source_code,
+        )
+    return session
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestViews:
+    @pytest.mark.anyio
+    async def test_get_code_in_one_query(
+        self, session_with_comments: Models.Session, count_queries
+    ):
+        with count_queries() as counter:
+            code = await Views.get_code(session_with_comments.id)
+        assert counter.count == 1
+        assert code.author == "octocat"
+        assert code.file_name == "main.py"
+        assert code.file_extension == "py"
+        assert code.file_display_path == "octocat/Hello-World/.../main.py"
+
+    @pytest.mark.anyio
+    async def test_get_comments_in_one_query(
+        self, session_with_comments: Models.Session, count_queries
+    ):
+        with count_queries() as counter:
+            comments = await Views.get_comments(session_with_comments.id)
+        assert counter.count == 1
+        assert len(comments) == 6
+        authors = {comment.content: comment.author.username for comment in comments}
+        assert authors["comment 0"] == "octocat"
+        assert authors["comment 4"] == "hubot"
+        assert authors["comment 5"] == "monalisa"
+
+    @pytest.mark.anyio
+    async def test_get_comments_without_code(
+        self, session: Models.Session, count_queries
+    ):
+        with count_queries() as counter:
+            comments = await Views.get_comments(session.id)
+        assert counter.count == 1
+        assert comments == []
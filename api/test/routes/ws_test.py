@@ -0,0 +1,187 @@
+import httpx
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock
+from db import Models, State
+from db import crud as Crud
+from routes.ws import (
+    AddCommentRequest,
+    WSAppStatusCodes,
+    WSEventContext,
+    WSResponseType,
+    on_add_comment,
+    on_load_player_files,
+    on_ready,
+    on_resync,
+)
+from services import BackgroundTasks, Connection, ConnectionManager
+from services.encoding import Encoding, decode_json
+from test.conftest import mock_gh_client
+
+
+def mock_connection(session_id: str, player_name: str):
+    connection = Mock(spec=Connection)
+    connection.session_id = session_id
+    connection.player_name = player_name
+    connection.encoding = Encoding.JSON
+    connection.send = AsyncMock()
+    connection.send_frame = AsyncMock()
+    connection.close = AsyncMock()
+    return connection
+
+
+def get_sent_frames(connection: Mock):
+    return [
+        decode_json(call.args[0].payload)
+        for call in connection.send_frame.await_args_list
+    ]
+
+
+@pytest.fixture
+async def session_with_code(session: Models.Session):
+    author = await Models.Author.create(username="octocat")
+    repo = await Models.Repository.create(
+        name="octocat/Hello-World",
+        default_branch="main",
+        last_pushed_at=datetime.now(timezone.utc),
+        author=author,
+    )
+    file = await Models.File.create(
+        path="main.py",
+        download_url="https://raw.githubusercontent.com/octocat/Hello-World/main/main.py",
+        visit_url="https://github.com/octocat/Hello-World/blob/main/main.py",
+        repo=repo,
+        author=author,
+    )
+    await Models.SourceCode.create(content="print('hello')", file=file, session=session)
+    return session
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestLoadPlayerFiles:
+    @pytest.mark.anyio
+    async def test_player_leaves_when_files_fail_to_load(self, session: Models.Session):
+        def user_to_repos(*args, **kwargs):
+            raise httpx.ReadTimeout("timed out")
+
+        gh_client = mock_gh_client(user_to_repos, lambda *args: [], lambda *args: "")
+        assert await Crud.join(session.id, "octocat")
+        session_states = State.SessionStateStore(60, 300)
+        connection_manager = ConnectionManager()
+        connection = mock_connection(session.id, "octocat")
+        connection_manager.add(connection)
+        ctx = WSEventContext(
+            session_id=session.id,
+            player_name="octocat",
+            connection=connection,
+            connection_manager=connection_manager,
+            gh_client=gh_client,
+            background_tasks=BackgroundTasks(),
+            session_states=session_states,
+        )
+
+        with pytest.raises(httpx.ReadTimeout):
+            await on_load_player_files(ctx)
+
+        connection.close.assert_awaited_once()
+        assert (
+            connection.close.await_args.kwargs["code"]
+            == WSAppStatusCodes.LOADING_FILES_ERRORED
+        )
+        player = await Models.Player.get(session_id=session.id, username="octocat")
+        assert not player.is_connected and not player.is_loading_files
+        state = await session_states.get(session.id)
+        assert not state.players["octocat"].is_connected
+        assert connection_manager.get_or_none(session.id, "octocat") is None
+        # rejoining loads the files again
+        assert await Crud.join(session.id, "octocat")
+
+    @pytest.mark.anyio
+    async def test_rejoining_while_loading_loads_again(self, session: Models.Session):
+        assert await Crud.join(session.id, "octocat")
+        with pytest.raises(Crud.PlayerRejoiningError) as e:
+            await Crud.join(session.id, "octocat")
+        assert e.value.is_loading_files
+
+
+@pytest.mark.usefixtures("clear_db")
+class TestSequencing:
+    async def get_contexts(self, session: Models.Session, player_names: list[str]):
+        session_states = State.SessionStateStore(60, 300)
+        connection_manager = ConnectionManager()
+        contexts = {}
+        for player_name in player_names:
+            await Crud.join(session.id, player_name)
+            connection = mock_connection(session.id, player_name)
+            connection_manager.add(connection)
+            contexts[player_name] = WSEventContext(
+                session_id=session.id,
+                player_name=player_name,
+                connection=connection,
+                connection_manager=connection_manager,
+                gh_client=mock_gh_client(
+                    lambda *args, **kwargs: ([], None),
+                    lambda *args: [],
+                    lambda *args: "",
+                ),
+                background_tasks=BackgroundTasks(),
+                session_states=session_states,
+            )
+        return contexts
+
+    @pytest.mark.anyio
+    async def test_batches_are_numbered_in_sequence(
+        self, session_with_code: Models.Session
+    ):
+        contexts = await self.get_contexts(session_with_code, ["octocat", "hubot"])
+        await on_ready(contexts["octocat"])
+        await on_add_comment(
+            contexts["hubot"],
+            AddCommentRequest(
+                content="nice",
+                line_start=1,
+                line_end=2,
+                type=Models.Comment.Type.DIAMOND,
+            ),
+        )
+        await on_ready(contexts["hubot"])
+
+        frames = get_sent_frames(contexts["hubot"].connection)
+        assert [frame["message_type"] for frame in frames] == [WSResponseType.BATCH] * 3
+        seqs = [frame["seq"] for frame in frames]
+        assert seqs == list(range(seqs[0], seqs[0] + 3))
+        assert [frame["messages"][0]["message_type"] for frame in frames] == [
+            WSResponseType.PLAYER_UPDATED,
+            WSResponseType.COMMENT_ADDED,
+            WSResponseType.PLAYER_UPDATED,
+        ]
+        assert frames == get_sent_frames(contexts["octocat"].connection)
+
+    @pytest.mark.anyio
+    async def test_resync_sends_snapshot_of_the_last_batch(
+        self, session_with_code: Models.Session
+    ):
+        contexts = await self.get_contexts(session_with_code, ["octocat", "hubot"])
+        await on_ready(contexts["octocat"])
+        await on_add_comment(
+            contexts["octocat"],
+            AddCommentRequest(
+                content="nice", line_start=1, line_end=2, type=Models.Comment.Type.POOP
+            ),
+        )
+        # the client missed a batch
+        last_batch = get_sent_frames(contexts["hubot"].connection)[-1]
+        await on_resync(contexts["hubot"])
+
+        snapshot = contexts["hubot"].connection.send.await_args.args[0]
+        assert snapshot["message_type"] == WSResponseType.SNAPSHOT
+        assert snapshot["seq"] == last_batch["seq"]
+        lobby, code, comments = snapshot["messages"]
+        assert {
+            player["username"]: player["is_ready"] for player in lobby["players"]
+        } == {
+            "octocat": True,
+            "hubot": False,
+        }
+        assert code["code"]["content"] == "print('hello')"
+        assert [comment["content"] for comment in comments["comments"]] == ["nice"]
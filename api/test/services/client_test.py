@@ -0,0 +1,37 @@
+import httpx
+import pytest
+from services import GithubClient
+from services.github.client import UnsupportedFileError
+
+
+def get_gh_client(handler):
+    return GithubClient(
+        "token", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+
+class TestDownloadFileFromUrl:
+    @pytest.mark.anyio
+    async def test_invalid_utf8_is_replaced(self):
+        gh_client = get_gh_client(
+            lambda request: httpx.Response(
+                200,
+                content="# café\n".encode("latin-1"),
+                headers={"Content-Type": "text/plain; charset=utf-8"},
+            )
+        )
+        content = await gh_client.download_file_from_url(
+            "https://raw.githubusercontent.com/octocat/Hello-World/main/main.py"
+        )
+        assert content == "# caf�\n"
+
+    @pytest.mark.anyio
+    async def test_binary_files_are_unsupported(self):
+        gh_client = get_gh_client(
+            lambda request: httpx.Response(200, content=b"\x89PNG\r\n\x1a\n\0\0")
+        )
+        with pytest.raises(UnsupportedFileError) as e:
+            await gh_client.download_file_from_url(
+                "https://raw.githubusercontent.com/octocat/Hello-World/main/logo.py"
+            )
+        assert e.value.reason == UnsupportedFileError.Reason.BINARY
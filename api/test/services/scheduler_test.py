@@ -0,0 +1,74 @@
+import anyio
+import time
+import pytest
+from services import GithubRequestScheduler, Priority
+
+
+def get_scheduler(max_wait: float = 60):
+    return GithubRequestScheduler(
+        reserves={
+            Priority.CRITICAL: 0,
+            Priority.INTERACTIVE: 10,
+            Priority.BACKGROUND: 50,
+        },
+        max_wait=max_wait,
+    )
+
+
+def get_rate_limit_headers(remaining: int):
+    return {
+        "x-ratelimit-limit": "5000",
+        "x-ratelimit-remaining": str(remaining),
+        "x-ratelimit-reset": str(time.time() + 60),
+    }
+
+
+class TestAcquire:
+    @pytest.mark.anyio
+    async def test_requests_are_admitted_in_priority_order(self):
+        scheduler = get_scheduler()
+        scheduler.observe(get_rate_limit_headers(0))
+        admitted = []
+
+        async def acquire(priority: Priority):
+            await scheduler.acquire(priority)
+            admitted.append(priority)
+
+        async with anyio.create_task_group() as tg:
+            for priority in [
+                Priority.BACKGROUND,
+                Priority.INTERACTIVE,
+                Priority.CRITICAL,
+            ]:
+                tg.start_soon(acquire, priority)
+            await anyio.sleep(0.01)
+            assert admitted == []
+            scheduler.observe(get_rate_limit_headers(100))
+
+        assert admitted == [
+            Priority.CRITICAL,
+            Priority.INTERACTIVE,
+            Priority.BACKGROUND,
+        ]
+
+    @pytest.mark.anyio
+    async def test_reserves_hold_back_lower_priorities(self):
+        scheduler = get_scheduler()
+        scheduler.observe(get_rate_limit_headers(20))
+
+        with anyio.fail_after(0.1):
+            await scheduler.acquire(Priority.CRITICAL)
+            await scheduler.acquire(Priority.INTERACTIVE)
+        with anyio.move_on_after(0.1) as scope:
+            await scheduler.acquire(Priority.BACKGROUND)
+        assert scope.cancel_called
+        assert scheduler.get_remaining() == 18
+
+    @pytest.mark.anyio
+    async def test_requests_are_sent_after_max_wait(self):
+        scheduler = get_scheduler(max_wait=0.05)
+        scheduler.observe(get_rate_limit_headers(0))
+
+        with anyio.fail_after(1):
+            await scheduler.acquire(Priority.BACKGROUND)
+        assert scheduler.get_remaining() == 0
@@ -0,0 +1,71 @@
+import anyio
+import pytest
+from services import SingleFlight
+
+
+class TestDo:
+    @pytest.mark.anyio
+    async def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        calls = []
+        results = []
+
+        async def fetch(url: str):
+            calls.append(url)
+            await anyio.sleep(0.01)
+            return f"print('{url}')"
+
+        async def do(key: str):
+            results.append(await single_flight.do(key, fetch, key))
+
+        async with anyio.create_task_group() as tg:
+            for key in ["a", "a", "a", "b"]:
+                tg.start_soon(do, key)
+
+        assert sorted(calls) == ["a", "b"]
+        assert sorted(results) == ["print('a')"] * 3 + ["print('b')"]
+        # the call is forgotten once it completed
+        await single_flight.do("a", fetch, "a")
+        assert len(calls) == 3
+
+    @pytest.mark.anyio
+    async def test_errors_are_raised_to_every_caller(self):
+        single_flight = SingleFlight()
+        errors = []
+
+        async def fetch():
+            await anyio.sleep(0.01)
+            raise ConnectionError("gone")
+
+        async def do():
+            try:
+                await single_flight.do("a", fetch)
+            except ConnectionError as e:
+                errors.append(e)
+
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(do)
+
+        assert len(errors) == 3
+        assert all([error is errors[0] for error in errors])
+
+    @pytest.mark.anyio
+    async def test_cancelled_callers_dont_cancel_the_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(None)
+            await anyio.sleep(0.05)
+            return "done"
+
+        async def do_cancelled():
+            with anyio.move_on_after(0.01):
+                await single_flight.do("a", fetch)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(do_cancelled)
+            await anyio.sleep(0)
+            assert await single_flight.do("a", fetch) == "done"
+        assert len(calls) == 1
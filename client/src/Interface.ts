@@ -69,13 +69,18 @@ export enum ResponseType {
   SOURCE_CODE = 4,
   COMMENTS = 5,
   BATCH = 6,
+  // no longer sent, COMMENT_ADDED took its place
   NEW_COMMENT = 7,
+  PLAYER_UPDATED = 8,
+  COMMENT_ADDED = 9,
+  SNAPSHOT = 10,
 }
 
 export enum RequestType {
   ADD_COMMENT = 1,
   READY = 2,
   WAIT = 3,
+  RESYNC = 4,
 }
 
 export enum GameStateEventType {
@@ -89,6 +94,8 @@ export interface GameStateEvent {
 
 export interface ResponsePayload extends GameStateEvent {
   message_type: ResponseType;
+  // set on batches and snapshots, the sequence number of the last broadcast they include
+  seq?: number;
 }
 
 export interface LobbyPayload extends ResponsePayload {
@@ -107,7 +114,11 @@ export interface CommentsPayload extends ResponsePayload {
   comments: Comment[];
 }
 
-export interface NewCommentPayload extends ResponsePayload {
+export interface PlayerUpdatedPayload extends ResponsePayload {
+  player: Player;
+}
+
+export interface CommentAddedPayload extends ResponsePayload {
   comment: Comment;
 }
 
@@ -115,6 +126,10 @@ export interface BatchPayload extends ResponsePayload {
   messages: ResponsePayload[];
 }
 
+export interface SnapshotPayload extends ResponsePayload {
+  messages: ResponsePayload[];
+}
+
 export interface AckNewComment extends GameStateEvent {
   comment_id: string;
 }
@@ -4,7 +4,8 @@ import {
   Player,
   SourceCodePayload,
   CommentsPayload,
-  NewCommentPayload,
+  PlayerUpdatedPayload,
+  CommentAddedPayload,
   GameStatus,
 } from "../../../Interface";
 
@@ -56,12 +57,39 @@ export const CommentsAction = (
   };
 };
 
-export const NewCommentAction = (
+export const PlayerUpdatedAction = (
   state: GameState,
-  payload: NewCommentPayload
+  payload: PlayerUpdatedPayload
 ): GameState => {
+  const { player } = payload;
+  const index = state.players.findIndex(
+    ({ username }) => username === player.username
+  );
+  let players = [...state.players];
+  if (!player.is_connected) {
+    players = players.filter(({ username }) => username !== player.username);
+  } else if (index === -1) {
+    players.push(player);
+  } else {
+    players[index] = player;
+  }
+  return {
+    ...state,
+    players,
+  };
+};
+
+export const CommentAddedAction = (
+  state: GameState,
+  payload: CommentAddedPayload
+): GameState => {
+  // a snapshot taken after the comment was added may already include it
+  if (state.comments.some(({ id }) => id === payload.comment.id)) {
+    return state;
+  }
   return {
     ...state,
+    comments: [...state.comments, payload.comment],
     new_comments: [...state.new_comments, payload.comment],
   };
 };
@@ -1,4 +1,5 @@
-import { useState, useEffect, useReducer } from "react";
+import { useState, useEffect, useReducer, useRef } from "react";
+import { decode } from "@msgpack/msgpack";
 import {
   AddComment,
   AlertPayload,
@@ -32,15 +33,52 @@ const INITIAL_GAME_STATE = {
 function useGameConnection(sessionId: string, onAlert: (alert: Alert) => void) {
   const [ws, setWs] = useState<WebSocket>();
   const [state, dispatch] = useReducer(gameReducer, { ...INITIAL_GAME_STATE });
+  // the sequence number of the last batch applied, and whether a snapshot was asked for after missing one
+  const lastSeq = useRef<number | null>(null);
+  const isResyncing = useRef(false);
 
   const [disconnectionMessage, setDisconnectionMessage] = useState<
     string | null
   >(null);
 
   useEffect(() => {
-    const socket = new WebSocket(getWebSocketAddress(sessionId));
+    const socket = new WebSocket(
+      getWebSocketAddress(sessionId),
+      config.socket.protocols
+    );
+    // MessagePack messages arrive as binary frames, JSON ones as text frames
+    socket.binaryType = "arraybuffer";
+    const isInSequence = (payload: ResponsePayload) => {
+      if (payload.seq === undefined) {
+        return true;
+      }
+      if (payload.message_type === ResponseType.SNAPSHOT) {
+        lastSeq.current = payload.seq;
+        isResyncing.current = false;
+        return true;
+      }
+      // batches until the first snapshot, and those a snapshot already includes, are skipped
+      if (lastSeq.current === null || payload.seq <= lastSeq.current) {
+        return false;
+      }
+      if (payload.seq === lastSeq.current + 1 && !isResyncing.current) {
+        lastSeq.current = payload.seq;
+        return true;
+      }
+      if (!isResyncing.current) {
+        isResyncing.current = true;
+        socket.send(JSON.stringify({ message_type: RequestType.RESYNC }));
+      }
+      return false;
+    };
+
     socket.onmessage = ({ data }) => {
-      const payload: ResponsePayload = JSON.parse(data);
+      const payload = (
+        data instanceof ArrayBuffer ? decode(data) : JSON.parse(data)
+      ) as ResponsePayload;
+      if (!isInSequence(payload)) {
+        return;
+      }
       if (payload.message_type === ResponseType.ALERT) {
         onAlert((payload as AlertPayload).alert);
       } else if (payload.message_type === ResponseType.BATCH) {
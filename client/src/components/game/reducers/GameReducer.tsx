@@ -3,7 +3,8 @@ import {
   CommentsAction,
   GameFinishedAction,
   LobbyAction,
-  NewCommentAction,
+  PlayerUpdatedAction,
+  CommentAddedAction,
   SourceCodeAction,
 } from "../actions/GameActions";
 import {
@@ -14,7 +15,9 @@ import {
   SourceCodePayload,
   CommentsPayload,
   BatchPayload,
-  NewCommentPayload,
+  SnapshotPayload,
+  PlayerUpdatedPayload,
+  CommentAddedPayload,
   GameStateEvent,
   GameStateEventType,
   AckNewComment,
@@ -28,8 +31,10 @@ function getNewStateFromWSResponse(state: GameState, payload: ResponsePayload) {
       return SourceCodeAction(state, payload as SourceCodePayload);
     case ResponseType.COMMENTS:
       return CommentsAction(state, payload as CommentsPayload);
-    case ResponseType.NEW_COMMENT:
-      return NewCommentAction(state, payload as NewCommentPayload);
+    case ResponseType.PLAYER_UPDATED:
+      return PlayerUpdatedAction(state, payload as PlayerUpdatedPayload);
+    case ResponseType.COMMENT_ADDED:
+      return CommentAddedAction(state, payload as CommentAddedPayload);
     case ResponseType.GAME_FINISHED:
       return GameFinishedAction(state);
     default:
@@ -41,6 +46,8 @@ function reduceWsResponse(state: GameState, payload: ResponsePayload) {
   let messages = [payload];
   if (payload.message_type === ResponseType.BATCH) {
     messages = (payload as BatchPayload).messages;
+  } else if (payload.message_type === ResponseType.SNAPSHOT) {
+    messages = (payload as SnapshotPayload).messages;
   }
   let newState = state;
   for (const message of messages) {
@@ -8,6 +8,8 @@ const config = {
   },
   socket: {
     uri: "socket/:sessionId",
+    // asks for messages as MessagePack rather than JSON, they are smaller
+    protocols: ["gitgame.msgpack"],
   },
   user: {
     uri: "user/"